@@ -0,0 +1,97 @@
+# address_parser.py
+import re
+from functools import lru_cache
+
+STREET_TYPES = {
+    "ST": "STREET", "STREET": "STREET",
+    "RD": "ROAD", "ROAD": "ROAD",
+    "AVE": "AVENUE", "AV": "AVENUE", "AVENUE": "AVENUE",
+    "DR": "DRIVE", "DRV": "DRIVE", "DRIVE": "DRIVE",
+    "CT": "COURT", "CRT": "COURT", "COURT": "COURT",
+    "CRES": "CRESCENT", "CR": "CRESCENT", "CRESCENT": "CRESCENT",
+    "PL": "PLACE", "PLACE": "PLACE",
+    "PDE": "PARADE", "PARADE": "PARADE",
+    "HWY": "HIGHWAY", "HIGHWAY": "HIGHWAY",
+    "BLVD": "BOULEVARD", "BVD": "BOULEVARD", "BOULEVARD": "BOULEVARD",
+    "CL": "CLOSE", "CLOSE": "CLOSE",
+    "LN": "LANE", "LANE": "LANE",
+    "TCE": "TERRACE", "TERRACE": "TERRACE",
+    "GR": "GROVE", "GROVE": "GROVE",
+    "WY": "WAY", "WAY": "WAY",
+    "CCT": "CIRCUIT", "CIRCUIT": "CIRCUIT",
+    "ESP": "ESPLANADE", "ESPLANADE": "ESPLANADE",
+    "SQ": "SQUARE", "SQUARE": "SQUARE",
+    "GDNS": "GARDENS", "GARDENS": "GARDENS",
+    "RISE": "RISE", "WALK": "WALK", "MEWS": "MEWS", "LOOP": "LOOP", "TRACK": "TRACK",
+}
+UNIT_TYPES = {
+    "UNIT": "UNIT", "U": "UNIT", "APT": "UNIT", "APARTMENT": "UNIT", "FLAT": "UNIT",
+    "SUITE": "SUITE", "STE": "SUITE", "SHOP": "SHOP", "FACTORY": "FACTORY", "OFFICE": "OFFICE",
+    "LEVEL": "LEVEL", "LVL": "LEVEL", "LOT": "LOT",
+}
+STATES = {
+    "VIC": "VIC", "VICTORIA": "VIC", "NSW": "NSW", "QLD": "QLD", "SA": "SA", "WA": "WA",
+    "TAS": "TAS", "NT": "NT", "ACT": "ACT",
+}
+
+CLEAN_PATTERN = re.compile(r"[^A-Z0-9/,' -]+")
+SPACE_PATTERN = re.compile(r"\s*,\s*|\s+")
+TAIL_PATTERN = re.compile(
+    r"(?:,|\s)\s*(?P<state>" + "|".join(sorted(STATES, key=len, reverse=True)) + r")?[\s,]*(?P<postcode>\d{4})?\s*$")
+UNIT_PATTERN = re.compile(
+    r"^(?:(?P<unit_type>" + "|".join(sorted(UNIT_TYPES, key=len, reverse=True)) + r")\s*(?P<unit>[0-9A-Z]+)\s*[,/ ]\s*"
+    r"|(?P<slash_unit>[0-9A-Z]+)\s*/\s*(?=\d))")
+STREET_PATTERN = re.compile(
+    r"^(?P<number>\d+[A-Z]?(?:-\d+[A-Z]?)?)\s+(?P<street>[A-Z0-9' -]+?)\s+"
+    r"(?P<street_type>" + "|".join(sorted(STREET_TYPES, key=len, reverse=True)) + r")\b\s*,?\s*(?P<rest>.*)$")
+FIELDS = ["unit_type", "unit", "number", "street", "street_type", "suburb", "state", "postcode"]
+
+
+def clean(text):
+    text = CLEAN_PATTERN.sub(" ", (text or "").upper().replace("\n", ", "))
+    return SPACE_PATTERN.sub(lambda m: ", " if "," in m.group() else " ", text).strip(" ,")
+
+
+@lru_cache(maxsize=65536)
+def parse_address(text):
+    text = clean(text)
+    parsed = dict.fromkeys(FIELDS, "")
+    tail = TAIL_PATTERN.search(text)
+    if tail and (tail.group("state") or tail.group("postcode")):
+        parsed["state"] = STATES.get(tail.group("state") or "", "")
+        parsed["postcode"] = tail.group("postcode") or ""
+        text = text[:tail.start()].strip(" ,")
+
+    unit = UNIT_PATTERN.match(text)
+    street = STREET_PATTERN.match(text[unit.end():]) if unit else None
+    if street:
+        parsed["unit_type"] = UNIT_TYPES.get(unit.group("unit_type") or "UNIT")
+        parsed["unit"] = unit.group("unit") or unit.group("slash_unit")
+    else:
+        street = STREET_PATTERN.match(text)
+    if street:
+        parsed["number"] = street.group("number")
+        parsed["street"] = street.group("street").strip()
+        parsed["street_type"] = STREET_TYPES[street.group("street_type")]
+        text = street.group("rest")
+    # Whatever is left after the street is the suburb, usually the last comma-separated part.
+    parts = [part for part in text.split(", ") if part]
+    if parts:
+        parsed["suburb"] = parts[-1] if street or len(parts) > 1 else ""
+    if not street:
+        parsed["street"] = ", ".join(parts[:-1] if len(parts) > 1 else parts)
+    return parsed
+
+
+@lru_cache(maxsize=65536)
+def address_key(text):
+    parsed = parse_address(text)
+    if not parsed["number"]:
+        # Not a street address (PO boxes, "VAC", free text): fall back to the cleaned text.
+        return clean(text)
+    number = f"{parsed['unit']}/{parsed['number']}" if parsed["unit"] else parsed["number"]
+    if parsed["unit_type"] not in ("", "UNIT"):
+        number = f"{parsed['unit_type']} {number}"
+    street = f"{number} {parsed['street']} {parsed['street_type']}"
+    locality = " ".join(part for part in [parsed["suburb"], parsed["state"] or "VIC", parsed["postcode"]] if part)
+    return f"{street}, {locality}"
@@ -0,0 +1,157 @@
+# aura_capture.py
+import json
+import os
+import re
+import time
+from urllib.parse import unquote_plus
+
+from selenium.common.exceptions import WebDriverException
+
+AURA_PATTERN = re.compile(r"/aura\?|/sfsites/aura|/apexremote")
+# Normalised Apex field names seen for each PractitionerDetail column, in sheet order.
+DETAIL_ALIASES = [
+    ("name", ["name", "practitionername", "fullname", "accountname", "registrantname"]),
+    ("category", ["category", "registrationcategory", "registrationtype", "licencetype", "class"]),
+    ("address", ["businessaddress", "address", "mailingaddress", "practitioneraddress"]),
+    ("contact", ["contactdetails", "contact", "phone", "email"]),
+    ("limitations", ["limitations", "limitation"]),
+    ("conditions", ["conditions", "condition"]),
+    ("status", ["status", "registrationstatus"]),
+    ("registration_number", ["registrationnumber", "registrationno", "licencenumber", "practitionernumber"]),
+    ("commenced", ["commenced", "commencementdate", "startdate"]),
+    ("anniversary", ["anniversary", "anniversarydate"]),
+    ("expires", ["expires", "expirydate", "enddate"]),
+    ("date_scs", ["datesuspended", "suspensiondate", "cancellationdate", "datesuspendedcancelledorsurrendered"]),
+    ("reason_scs", ["reasonforsuspension", "suspensionreason", "cancellationreason"]),
+    ("director_name", ["directorname", "directors", "director"]),
+    ("partnership", ["partnershipdetails", "partnership", "partners"]),
+]
+REQUIRED = ["name", "category", "registration_number"]
+# Same as the DOM scraper: multi-line values are flattened with ", ".
+JOINED = {"address", "limitations", "conditions", "reason_scs", "director_name"}
+
+
+def normalise_key(key):
+    return re.sub(r"[^a-z0-9]", "", key.lower().replace("__c", ""))
+
+
+def as_text(value):
+    if isinstance(value, list):
+        return ", ".join(as_text(item) for item in value if item not in (None, ""))
+    if isinstance(value, dict):
+        return ", ".join(as_text(item) for item in value.values() if item not in (None, ""))
+    return "" if value is None else str(value)
+
+
+def records(value):
+    # Apex often returns JSON inside a string; walk into those as well.
+    if isinstance(value, str) and value[:1] in "[{":
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return
+    if isinstance(value, dict):
+        yield value
+        for item in value.values():
+            yield from records(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from records(item)
+
+
+def detail_from_actions(actions):
+    best, best_score = None, 0
+    for action in actions:
+        for record in records(action.get("value")):
+            fields = {normalise_key(key): value for key, value in record.items() if not isinstance(value, dict)}
+            found = {}
+            for column, aliases in DETAIL_ALIASES:
+                for alias in aliases:
+                    if alias in fields:
+                        text = as_text(fields[alias]).strip()
+                        found[column] = text.replace("\n", ", ") if column in JOINED else text
+                        break
+            if all(found.get(column) for column in REQUIRED) and len(found) > best_score:
+                best, best_score = found, len(found)
+    if best is None:
+        return None
+    return [best.get(column, "") for column, _ in DETAIL_ALIASES]
+
+
+class AuraCapture:
+    def __init__(self, driver, enabled=None, pattern=AURA_PATTERN):
+        self.driver = driver
+        # Needs the performance log, which set_driver only turns on under AURA_CAPTURE=1.
+        self.enabled = os.environ.get("AURA_CAPTURE") == "1" if enabled is None else enabled
+        self.pattern = pattern
+        self.descriptors = {}
+        self.pending = {}
+        self.actions = []
+
+    def reset(self):
+        if self.enabled:
+            self.drain()
+        self.descriptors = {}
+        self.pending = {}
+        self.actions = []
+
+    def drain(self):
+        try:
+            entries = self.driver.get_log("performance")
+        except WebDriverException as e:
+            print(f"Aura capture is unavailable: {e.msg}")
+            self.enabled = False
+            return self.actions
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            params = message.get("params", {})
+            method = message.get("method")
+            if method == "Network.requestWillBeSent" and self.pattern.search(params["request"]["url"]):
+                self.remember_request(params["request"].get("postData", ""))
+            elif method == "Network.responseReceived" and self.pattern.search(params["response"]["url"]):
+                self.pending[params["requestId"]] = params["response"]["url"]
+            elif method == "Network.loadingFinished" and params.get("requestId") in self.pending:
+                self.read_body(params["requestId"])
+        return self.actions
+
+    def remember_request(self, post_data):
+        # Aura posts form data whose "message" holds the action descriptors; responses only echo ids.
+        match = re.search(r"(?:^|&)message=([^&]*)", post_data or "")
+        if not match:
+            return
+        try:
+            message = json.loads(unquote_plus(match.group(1)))
+        except ValueError:
+            return
+        for action in message.get("actions", []):
+            self.descriptors[action.get("id")] = (action.get("descriptor"), action.get("params"))
+
+    def read_body(self, request_id):
+        self.pending.pop(request_id, None)
+        try:
+            body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except WebDriverException:
+            return
+        text = body.get("body", "")
+        # Aura prefixes its JSON with a while(1); guard on some endpoints.
+        text = text[text.find("{"):] if "{" in text else text
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            return
+        for action in payload.get("actions", []) if isinstance(payload, dict) else []:
+            if action.get("state") != "SUCCESS":
+                continue
+            descriptor, params = self.descriptors.get(action.get("id"), (None, None))
+            self.actions.append({"descriptor": descriptor, "params": params, "value": action.get("returnValue")})
+
+    def wait_for(self, parse, timeout=10, poll=0.25):
+        if not self.enabled:
+            return None
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            result = parse(self.drain())
+            if result is not None or not self.enabled:
+                return result
+            time.sleep(poll)
+        return None
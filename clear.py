@@ -1,51 +1,12 @@
 # clear.py
-import json
 from google_form_package import Sheet
+from progress_service import ProgressService
 
 
 def main():
     web_sheet = Sheet()
     progress_sheet = web_sheet.get_worksheet("Progress")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 0})]], range_name="A1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 1})]], range_name="B1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 2})]], range_name="C1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 3})]], range_name="D1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 4})]], range_name="E1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 5})]], range_name="F1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 6})]], range_name="G1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 7})]], range_name="H1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 8})]], range_name="I1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 9})]], range_name="J1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 10})]], range_name="K1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 11})]], range_name="L1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 12})]], range_name="M1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 13})]], range_name="N1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 14})]], range_name="O1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 15})]], range_name="P1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 16})]], range_name="Q1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 17})]], range_name="R1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 18})]], range_name="S1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "UrlNum": 19})]], range_name="T1")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 0})]], range_name="A2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 1})]], range_name="B2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 2})]], range_name="C2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 3})]], range_name="D2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 4})]], range_name="E2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 5})]], range_name="F2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 6})]], range_name="G2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 7})]], range_name="H2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 8})]], range_name="I2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 9})]], range_name="J2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 10})]], range_name="K2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 11})]], range_name="L2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 12})]], range_name="M2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 13})]], range_name="N2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 14})]], range_name="O2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 15})]], range_name="P2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 16})]], range_name="Q2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 17})]], range_name="R2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 18})]], range_name="S2")
-    progress_sheet.update(values=[[json.dumps({"progress": "setting", "RowNum": 19})]], range_name="T2")
+    ProgressService(progress_sheet).reset()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
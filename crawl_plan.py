@@ -0,0 +1,301 @@
+# crawl_plan.py
+import hashlib
+import json
+import math
+import os
+import string
+import sys
+from abc import ABC, abstractmethod
+from collections import Counter
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from google_form_package import Sheet
+from postcode_catalogue import POSTCODE_FILE, PostcodeCatalogue
+from search_paging import RESULTS_XPATH
+from sheet_reader import read_columns
+from sheet_schema import get_schema
+
+SAVED_PLAN_FILE = "crawl_plan.json"
+DEFAULT_PAGE_SIZE = 10
+SEARCH_URL = "https://bams.vba.vic.gov.au/bams/s/practitioner-search"
+RESULT_LINKS = "//a[contains(@class, 'search-result-name-text-style')]"
+# One practitioner in HOLDOUT is kept out of the facet lists, so coverage is measured on unseen records.
+HOLDOUT = 5
+
+
+class CrawlPlan(ABC):
+    # One way of slicing the BAMS practitioner search into queries that together list everyone.
+    name = None
+    input_xpath = None
+    # Only the postcode search is what the link shards have always run; the others need a live probe.
+    verified = False
+
+    @abstractmethod
+    def queries(self):
+        pass
+
+    @property
+    def label(self):
+        return self.name
+
+    @abstractmethod
+    def matches(self, practitioner):
+        # The queries of this plan whose results would include the practitioner.
+        pass
+
+
+class PostcodePlan(CrawlPlan):
+    name = "postcode"
+    input_xpath = "//input[@name='postcode']"
+    verified = True
+
+    def __init__(self, path=POSTCODE_FILE):
+        self.path = path
+
+    def queries(self):
+        return PostcodeCatalogue.load(self.path).queries()
+
+    def matches(self, practitioner):
+        return practitioner["postcodes"]
+
+
+class NamePrefixPlan(CrawlPlan):
+    name = "name"
+    input_xpath = "//input[@name='name']"
+
+    def __init__(self, length=2):
+        self.length = length
+
+    @property
+    def label(self):
+        return f"name[:{self.length}]"
+
+    def queries(self):
+        alphabet = string.ascii_uppercase + string.digits
+        prefixes = [""]
+        for _ in range(self.length):
+            prefixes = [prefix + char for prefix in prefixes for char in alphabet]
+        return prefixes
+
+    def matches(self, practitioner):
+        prefix = "".join(char for char in practitioner["name"].upper() if char.isalnum())[:self.length]
+        return {prefix} if len(prefix) == self.length else set()
+
+
+class CategoryPlan(CrawlPlan):
+    name = "category"
+    input_xpath = "//input[@name='practitionerType']"
+
+    def __init__(self, categories=None):
+        self.categories = categories or []
+
+    def queries(self):
+        return list(self.categories)
+
+    def matches(self, practitioner):
+        return practitioner["categories"]
+
+
+class RegistrationPrefixPlan(CrawlPlan):
+    name = "registration"
+    input_xpath = "//input[@name='registrationNumber']"
+
+    def __init__(self, prefixes=None, length=5):
+        self.prefixes = prefixes or []
+        self.length = length
+
+    def queries(self):
+        return list(self.prefixes)
+
+    def matches(self, practitioner):
+        registration = practitioner["registration"]
+        return {registration[:self.length]} if registration else set()
+
+
+class SavedPlan(CrawlPlan):
+    # The query list written by `python crawl_plan.py --save`, so every link shard crawls the same facet.
+    # Commit crawl_plan.json after saving it; CI runners only see files in the repository.
+    name = "saved"
+
+    def __init__(self, path=SAVED_PLAN_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        self.label_text = saved["plan"]
+        self.input_xpath = saved["input_xpath"]
+        self.saved_queries = saved["queries"]
+
+    @property
+    def label(self):
+        return self.label_text
+
+    def queries(self):
+        return list(self.saved_queries)
+
+    def matches(self, practitioner):
+        return set()
+
+    @staticmethod
+    def save(plan, path=SAVED_PLAN_FILE):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"plan": plan.label, "input_xpath": plan.input_xpath, "queries": plan.queries()}, f, indent=1)
+        print(f"Saved the {plan.label} plan to {path}.")
+
+
+PLANS = {plan.name: plan for plan in [PostcodePlan, NamePrefixPlan, SavedPlan]}
+
+
+def get_plan(name=None):
+    # CRAWL_PLAN=postcode (default), name, or saved; category and registration plans need known facets,
+    # so they run through `--save`.
+    name = name or os.environ.get("CRAWL_PLAN", "postcode")
+    if name not in PLANS:
+        raise ValueError(f"Unknown crawl plan '{name}'. Choose from {', '.join(PLANS)}.")
+    return PLANS[name]()
+
+
+def load_practitioners(web_sheet):
+    # Everything the last crawl found, keyed by detail link, with the facets each plan could search on.
+    link_sheet = web_sheet.get_worksheet("PractitionerLink")
+    link_schema = get_schema("PractitionerLink", web_sheet.get_header(link_sheet))
+    practitioners = {}
+    for postcode, name, link in read_columns(link_sheet, link_schema, ["postcode", "Name", "Link"]):
+        if not link:
+            continue
+        practitioner = practitioners.setdefault(
+            link, {"link": link, "name": name, "postcodes": set(), "categories": set(), "registration": ""})
+        practitioner["postcodes"].add(postcode)
+
+    detail_sheet = web_sheet.get_worksheet("PractitionerDetail")
+    detail_schema = get_schema("PractitionerDetail", web_sheet.get_header(detail_sheet))
+    for category, registration, link in read_columns(detail_sheet, detail_schema,
+                                                     ["Category", "Registration number", "Link"]):
+        if link in practitioners:
+            practitioners[link]["categories"].update(cat.strip() for cat in category.split(",") if cat.strip())
+            practitioners[link]["registration"] = registration
+    return list(practitioners.values())
+
+
+def held_out(practitioner):
+    return int(hashlib.sha1(practitioner["link"].encode("utf-8")).hexdigest(), 16) % HOLDOUT == 0
+
+
+def split(practitioners):
+    # Stable across runs, so the same records are held out every time.
+    known = [practitioner for practitioner in practitioners if not held_out(practitioner)]
+    unseen = [practitioner for practitioner in practitioners if held_out(practitioner)]
+    return known, unseen
+
+
+def estimate(plan, practitioners, page_size=DEFAULT_PAGE_SIZE, unseen=None):
+    # Requests are counted over everyone; coverage over the unseen records when given, since plans built
+    # from the known facets cover the known records by construction.
+    queries = plan.queries()
+    known = set(queries)
+    results = Counter()
+    for practitioner in practitioners:
+        results.update(plan.matches(practitioner) & known)
+    sample = practitioners if unseen is None else unseen
+    covered = sum(1 for practitioner in sample if plan.matches(practitioner) & known)
+    # One search per query, plus one click for every page after the first.
+    requests = sum(max(1, math.ceil(results[query] / page_size)) for query in queries)
+    listed = sum(1 for practitioner in practitioners if plan.matches(practitioner) & known)
+    return {
+        "plan": plan.label,
+        "queries": len(queries),
+        "requests": requests,
+        "results": sum(results.values()),
+        "coverage": covered / len(sample) if sample else 0.0,
+        "overlap": sum(results.values()) / listed if listed else 0.0,
+        "verified": plan.verified,
+    }
+
+
+def candidate_plans(practitioners):
+    categories = sorted({category for practitioner in practitioners for category in practitioner["categories"]})
+    prefixes = sorted({practitioner["registration"][:5] for practitioner in practitioners
+                       if practitioner["registration"]})
+    return [PostcodePlan(), NamePrefixPlan(1), NamePrefixPlan(2), CategoryPlan(categories),
+            RegistrationPrefixPlan(prefixes)]
+
+
+def search_links(driver, plan, query, timeout=15):
+    driver.get(SEARCH_URL)
+    search_input = WebDriverWait(driver, timeout).until(EC.element_to_be_clickable((By.XPATH, plan.input_xpath)))
+    search_input.clear()
+    search_input.send_keys(query)
+    WebDriverWait(driver, timeout).until(EC.element_to_be_clickable((By.XPATH, "//button[text()='Search']"))).click()
+    WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.XPATH, RESULTS_XPATH)))
+    return {element.get_attribute("href") for element in driver.find_elements(By.XPATH, RESULT_LINKS)}
+
+
+def probe(plan, practitioners, driver, page_size=DEFAULT_PAGE_SIZE, samples=3):
+    # Search the live site for a few practitioners with the query the plan says would list them. Queries
+    # small enough for one page are used, so a miss means the input or the matching is wrong.
+    queries = set(plan.queries())
+    sizes = Counter(query for practitioner in practitioners for query in plan.matches(practitioner) & queries)
+    picked = []
+    for practitioner in practitioners:
+        small = sorted(query for query in plan.matches(practitioner) & queries if sizes[query] <= page_size)
+        if small:
+            picked.append((practitioner, small[0]))
+        if len(picked) >= samples:
+            break
+    if not picked:
+        return False
+    for practitioner, query in picked:
+        try:
+            found = search_links(driver, plan, query)
+        except (TimeoutException, WebDriverException) as e:
+            print(f"Probe of {plan.label} failed on '{query}': {e}")
+            return False
+        if practitioner["link"] not in found:
+            print(f"Probe of {plan.label}: '{query}' did not list {practitioner['name']}.")
+            return False
+    return True
+
+
+def choose_plan(practitioners, page_size=DEFAULT_PAGE_SIZE, min_coverage=0.99, driver=None):
+    # Facets come from the known records and coverage is measured on the held-out ones. A plan the shards
+    # have not run before is only picked once a live probe (driver given) has confirmed it.
+    known, unseen = split(practitioners)
+    estimates = []
+    for plan in candidate_plans(known):
+        found = estimate(plan, practitioners, page_size, unseen)
+        if not plan.verified and driver is not None and found["coverage"] >= min_coverage:
+            found["verified"] = probe(plan, practitioners, driver, page_size)
+        estimates.append((found, plan))
+    usable = [(found, plan) for found, plan in estimates if found["verified"]]
+    complete = [(found, plan) for found, plan in usable if found["coverage"] >= min_coverage]
+    best = min(complete or usable, key=lambda pair: (pair[0]["requests"], -pair[0]["coverage"]))
+    return best[1], [found for found, _ in estimates]
+
+
+def main():
+    # crawl_plan.py [page_size] [--probe] [--save]; --probe checks unverified plans on the live site.
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    page_size = int(args[0]) if args else DEFAULT_PAGE_SIZE
+    web_sheet = Sheet()
+    practitioners = load_practitioners(web_sheet)
+    driver = web_sheet.lazy_driver() if "--probe" in sys.argv else None
+    try:
+        plan, estimates = choose_plan(practitioners, page_size, driver=driver)
+    finally:
+        if driver is not None:
+            driver.quit()
+    print(f"{len(practitioners)} practitioners known from the last crawl, {page_size} results per page; "
+          f"coverage is measured on the 1 in {HOLDOUT} held out of the facet lists.")
+    for found in estimates:
+        print(f"{found['plan']:>12}: {found['queries']:>5} queries, {found['requests']:>6} requests, "
+              f"coverage {found['coverage']:.1%}, each practitioner listed {found['overlap']:.2f}x"
+              f"{'' if found['verified'] else ', not verified'}")
+    print(f"Cheapest verified plan with full coverage: {plan.label}")
+    if "--save" in sys.argv:
+        SavedPlan.save(plan)
+
+
+if __name__ == "__main__":
+    main()
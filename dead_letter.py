@@ -0,0 +1,75 @@
+# dead_letter.py
+import time
+
+import gspread
+from gspread.utils import rowcol_to_a1
+
+from sheet_reader import read_columns
+from sheet_schema import get_schema
+
+SHEET_NAME = "DeadLetter"
+
+
+class DeadLetterStore:
+    def __init__(self, web_sheet, retries=5, delay=30):
+        self.web_sheet = web_sheet
+        self.retries = retries
+        self.delay = delay
+        self.schema = get_schema(SHEET_NAME)
+        self.worksheet = None
+
+    def with_retry(self, action, label):
+        delay = self.delay
+        for attempt in range(self.retries):
+            try:
+                return action()
+            except Exception as e:
+                print(f"DeadLetter: failed to {label}: {e}. Retry after {delay} seconds... ({attempt + 1}/{self.retries})")
+                time.sleep(delay)
+                delay *= 2
+        print(f"DeadLetter: could not {label} after {self.retries} attempts.")
+        return None
+
+    def get_sheet(self):
+        if self.worksheet is None:
+            try:
+                self.worksheet = self.web_sheet.get_worksheet(SHEET_NAME)
+            except gspread.exceptions.WorksheetNotFound:
+                spreadsheet = self.web_sheet.spreadsheet
+                self.worksheet = spreadsheet.add_worksheet(SHEET_NAME, rows=1000, cols=len(self.schema.columns))
+                self.worksheet.append_row(self.schema.columns)
+                self.web_sheet.worksheets[SHEET_NAME] = self.worksheet
+            self.web_sheet.set_header(self.worksheet, self.schema.columns)
+            self.schema.validated = True
+        return self.worksheet
+
+    def record(self, row_num, link, postcode, reason, seconds, shard):
+        row = [row_num, link, postcode, reason, round(seconds, 1), shard,
+               time.strftime("%Y-%m-%d %H:%M:%S"), 0, "pending"]
+        self.with_retry(lambda: self.get_sheet().append_row(row, value_input_option="USER_ENTERED"), "record failure")
+        print(f"DeadLetter: row {row_num} recorded ({reason}).")
+
+    def pending(self, max_attempts=3):
+        rows = self.with_retry(lambda: read_columns(self.get_sheet(), self.schema, self.schema.columns), "read entries")
+        entries = {}
+        for sheet_row, values in enumerate(rows or [], start=2):
+            entry = dict(zip(self.schema.columns, values))
+            entry["sheet_row"] = sheet_row
+            if not entry["Link"]:
+                continue
+            # A link can fail in several waves; only its latest record counts.
+            entries[entry["Link"]] = entry
+        return [entry for entry in entries.values()
+                if entry["Status"] == "pending" and int(entry["Attempts"] or 0) < max_attempts]
+
+    def mark(self, entry, status, reason=None, seconds=None):
+        entry["Attempts"] = int(entry["Attempts"] or 0) + 1
+        entry["Status"] = status
+        if reason:
+            entry["Reason"] = reason
+        if seconds is not None:
+            entry["Seconds"] = round(seconds, 1)
+        start = rowcol_to_a1(entry["sheet_row"], self.schema.col("Reason"))
+        end = rowcol_to_a1(entry["sheet_row"], self.schema.col("Status"))
+        values = [[entry[column] for column in self.schema.columns[self.schema.col("Reason") - 1:]]]
+        self.with_retry(lambda: self.get_sheet().update(values=values, range_name=f"{start}:{end}"), "update entry")
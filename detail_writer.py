@@ -0,0 +1,283 @@
+# detail_writer.py
+import hashlib
+import json
+import time
+from array import array
+
+from gspread.utils import rowcol_to_a1
+
+from address_parser import address_key, clean, parse_address
+from sheet_reader import read_new_rows
+from sheet_schema import SchemaError, get_schema
+
+TOMBSTONE = "tombstone"
+FIELD_COUNT = 18
+
+
+def digest64(text):
+    # 8-byte fingerprint of a key, content hash or link; 0 stands for an empty value.
+    if not text:
+        return 0
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+TOMBSTONE_DIGEST = digest64(TOMBSTONE)
+
+
+def row_hash(row):
+    # Category is left out: it is merged across registrations and compared on its own.
+    values = [row[0]] + list(row[2:FIELD_COUNT])
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def merge_category(current, new_category):
+    categories = [cat.strip() for cat in current.split(",") if cat.strip()] if current else []
+    if new_category and new_category not in categories:
+        categories.append(new_category)
+    return ", ".join(categories)
+
+
+def ensure_detail_sheet(web_sheet, worksheet):
+    # The sheet is no longer cleared each cycle; only a missing or outdated header is rewritten.
+    schema = get_schema("PractitionerDetail")
+    headers = schema.header()
+    try:
+        schema.validate(web_sheet.get_header(worksheet, refresh=True))
+    except SchemaError:
+        end = rowcol_to_a1(1, len(headers))
+        worksheet.update(values=[headers], range_name=f"A1:{end}")
+        schema.validated = True
+        print(f"Updated the PractitionerDetail header to schema v{schema.version}.")
+    web_sheet.set_header(worksheet, headers)
+    return worksheet
+
+
+class SeenIndex:
+    # Rows already on PractitionerDetail, kept as 64-bit digests in flat arrays: a few dozen bytes per row
+    # instead of the key, hash and link text. Category lists repeat a lot, so each distinct one is stored once.
+    def __init__(self):
+        self.positions = {}
+        self.row_nums = array("I")
+        self.hashes = array("Q")
+        self.links = array("Q")
+        self.category_ids = array("I")
+        self.categories = []
+        self.category_lookup = {}
+
+    def __len__(self):
+        return len(self.row_nums)
+
+    def category_id(self, category):
+        if category not in self.category_lookup:
+            self.category_lookup[category] = len(self.categories)
+            self.categories.append(category)
+        return self.category_lookup[category]
+
+    def add(self, key, row_num, category, content_hash, link):
+        position = self.positions.setdefault(digest64(key), len(self.row_nums))
+        if position == len(self.row_nums):
+            self.row_nums.append(row_num)
+            self.hashes.append(0)
+            self.links.append(0)
+            self.category_ids.append(0)
+        # A later row with the same key wins.
+        self.row_nums[position] = row_num
+        self.set(position, category, content_hash, link)
+
+    def find(self, key):
+        return self.positions.get(digest64(key))
+
+    def row(self, position):
+        return self.row_nums[position]
+
+    def category(self, position):
+        return self.categories[self.category_ids[position]]
+
+    def is_tombstone(self, position):
+        return self.hashes[position] == TOMBSTONE_DIGEST
+
+    def same_hash(self, position, content_hash):
+        return self.hashes[position] == digest64(content_hash)
+
+    def other_link(self, position, link):
+        return self.links[position] != 0 and self.links[position] != digest64(link)
+
+    def set(self, position, category=None, content_hash=None, link=None):
+        if category is not None:
+            self.category_ids[position] = self.category_id(category)
+        if content_hash is not None:
+            self.hashes[position] = digest64(content_hash)
+        if link is not None:
+            self.links[position] = digest64(link)
+
+    def listed(self):
+        return sum(1 for position in range(len(self)) if self.links[position] and not self.is_tombstone(position))
+
+    def unlisted(self, live_links):
+        # Positions with a recorded link that is no longer listed, not tombstoned yet.
+        live = {digest64(link) for link in live_links}
+        return [position for position in range(len(self))
+                if self.links[position] and self.links[position] not in live and not self.is_tombstone(position)]
+
+
+class DetailWriter:
+    def __init__(self, web_sheet, sheet_name="PractitionerDetail", flush_every=10, retries=5, delay=30, read_rows=5000):
+        self.web_sheet = web_sheet
+        self.sheet_name = sheet_name
+        self.flush_every = flush_every
+        self.retries = retries
+        self.delay = delay
+        self.schema = get_schema(sheet_name)
+        self.read_rows = read_rows
+        self.index = SeenIndex()
+        self.high_water = 1
+        self.inserts = {}
+        self.updates = {}
+        self.unchanged = 0
+        # The sheet is re-read once per flush, not on every write.
+        self.stale = True
+
+    @staticmethod
+    def key(name, address):
+        # Canonical forms, so "Unit 3, 12 Smith St" and "3/12 SMITH STREET" are the same practitioner.
+        return f"{clean(name)}|{address_key(address)}"
+
+    def with_retry(self, action, label):
+        delay = self.delay
+        for attempt in range(self.retries):
+            try:
+                return action()
+            except Exception as e:
+                print(f"DetailWriter: failed to {label}: {e}. Retry after {delay} seconds... ({attempt + 1}/{self.retries})")
+                time.sleep(delay)
+                delay *= 2
+        raise Exception(f"DetailWriter: could not {label} after {self.retries} attempts.")
+
+    def worksheet(self):
+        return self.web_sheet.get_worksheet(self.sheet_name)
+
+    def refresh(self):
+        columns = ["Name", "Business address", "Category", "Row hash", "Link"]
+        while True:
+            # A window at a time, so the first read of a large sheet never holds every row's text at once.
+            rows, high_water = self.with_retry(
+                lambda: read_new_rows(self.worksheet(), self.schema, columns, self.high_water, self.read_rows),
+                "read new rows")
+            for row_num, (name, address, category, content_hash, link) in enumerate(rows, start=self.high_water + 1):
+                self.index.add(self.key(name, address), row_num, category, content_hash, link)
+            self.high_water = high_water
+            if len(rows) < self.read_rows:
+                break
+        self.stale = False
+
+    def write(self, row, link):
+        if self.stale:
+            self.refresh()
+        if len(row) >= FIELD_COUNT and not str(row[FIELD_COUNT - 1]).isdigit():
+            # Crawl plans other than postcode leave their query term here; fall back to the address postcode,
+            # and mark the rows whose address has none instead of leaving the cell blank.
+            row = list(row[:FIELD_COUNT - 1]) + [parse_address(row[2])["postcode"] or "N/A"]
+        name, category, address = row[0], row[1], row[2]
+        key = self.key(name, address)
+        if key in self.inserts:
+            pending = self.inserts[key]
+            pending[1] = merge_category(pending[1], category)
+            return "insert"
+
+        position = self.index.find(key)
+        if position is None:
+            new_row = self.full_row(row, link)
+            self.inserts[key] = new_row
+            return "insert"
+
+        row_num = self.index.row(position)
+        if self.index.is_tombstone(position):
+            # Listed again after being dropped: bring the old row back instead of adding a new one.
+            new_row = self.full_row(row, link)
+            self.updates[(row_num, 1)] = [new_row]
+            self.index.set(position, category, new_row[self.schema.col("Row hash") - 1], link)
+            return "update"
+
+        current = self.index.category(position)
+        merged = merge_category(current, category)
+        if self.index.other_link(position, link):
+            # Same practitioner under another registration link: only the category list grows.
+            if merged != current:
+                self.updates[(row_num, self.schema.col("Category"))] = [[merged]]
+                self.index.set(position, category=merged)
+                return "update"
+            self.unchanged += 1
+            return "unchanged"
+
+        new_row = self.full_row([row[0], merged] + list(row[2:]), link)
+        new_hash = new_row[self.schema.col("Row hash") - 1]
+        if self.index.same_hash(position, new_hash):
+            if merged == current:
+                self.unchanged += 1
+                return "unchanged"
+            self.updates[(row_num, self.schema.col("Category"))] = [[merged]]
+            self.index.set(position, category=merged)
+            return "update"
+        self.updates[(row_num, 1)] = [new_row]
+        self.index.set(position, merged, new_hash, link)
+        self.track(key, new_row, row_num)
+        return "update"
+
+    def full_row(self, row, link):
+        values = list(row[:FIELD_COUNT]) + [""] * (FIELD_COUNT - len(row))
+        full = values + [""] * (len(self.schema.columns) - FIELD_COUNT)
+        # Leave the status slot empty so row values never shift the hash/link columns.
+        full[self.schema.col("Row hash") - 1] = row_hash(values)
+        full[self.schema.col("Link") - 1] = link
+        return full
+
+    def pending(self):
+        return len(self.inserts) + len(self.updates)
+
+    def flush_due(self):
+        return self.pending() >= self.flush_every
+
+    def flush(self):
+        if self.updates:
+            data = []
+            for (row_num, col), values in self.updates.items():
+                start = rowcol_to_a1(row_num, col)
+                end = rowcol_to_a1(row_num, col + len(values[0]) - 1)
+                data.append({"range": f"{start}:{end}", "values": values})
+            self.with_retry(lambda: self.worksheet().batch_update(data, value_input_option="USER_ENTERED"),
+                            "update rows")
+            print(f"DetailWriter: updated {len(data)} changed rows.")
+            self.updates = {}
+        if self.inserts:
+            rows = list(self.inserts.values())
+            self.with_retry(lambda: self.worksheet().append_rows(rows, value_input_option="USER_ENTERED"),
+                            "append rows")
+            print(f"DetailWriter: inserted {len(rows)} new rows.")
+            self.inserts = {}
+        if self.unchanged:
+            print(f"DetailWriter: skipped {self.unchanged} unchanged rows.")
+            self.unchanged = 0
+        # Other shards have appended meanwhile; pick their rows up before the next write.
+        self.stale = True
+
+    def tombstone(self, live_links, max_drop=0.2, force=False):
+        self.refresh()
+        # An empty or truncated link list would mark most of the sheet as gone; leave it for a person to check.
+        if not live_links:
+            print("DetailWriter: the link list is empty; no rows tombstoned.")
+            return 0
+        unlisted = self.index.unlisted(live_links)
+        listed = self.index.listed()
+        if not force and listed and len(unlisted) > max_drop * listed:
+            print(f"DetailWriter: {len(unlisted)} of {listed} listed rows are missing from this cycle's links, "
+                  f"more than {max_drop:.0%}; no rows tombstoned. Set FORCE_TOMBSTONES=1 to apply them.")
+            return 0
+        col = self.schema.col("Row hash")
+        data = []
+        for position in unlisted:
+            data.append({"range": rowcol_to_a1(self.index.row(position), col), "values": [[TOMBSTONE]]})
+            self.index.set(position, content_hash=TOMBSTONE)
+        if data:
+            self.with_retry(lambda: self.worksheet().batch_update(data), "write tombstones")
+        print(f"DetailWriter: tombstoned {len(data)} rows that are no longer listed.")
+        return len(data)
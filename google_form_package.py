@@ -1,9 +1,31 @@
 # google_form_package.py
+import json
 import os  # noqa
+import shutil
+import statistics
+import sys
+import tempfile
 import time
 import gspread
 from google.oauth2.service_account import Credentials
+from gspread.utils import extract_id_from_url
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
+from urllib3.util.retry import Retry
+
+from politeness import PolitenessScheduler, load_proxy_pool
+
+SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1leD8qGyOZzmR1fSa7QNgB9GLoRlVrkHqlQrigEOOTcA/edit?gid=0#gid=0"
+# Outside cache/, so the workflow caches never save Chrome's 100 MB disk cache; CHROME_PROFILE_DIR overrides.
+PROFILE_DIR = os.environ.get("CHROME_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "practitioner-chrome")
+LEGACY_PROFILE_DIR = os.path.join("cache", "chrome")
+# Nothing the scrapers read comes from these: images, media, fonts, map tiles and trackers.
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*facebook.net*", "*hotjar.com*", "*/maps/vt*", "*/maps/vt?*", "*khms*.googleapis.com*", "*/kh/v=*",
+]
 
 class Sheet:
     def __init__(self):
@@ -12,22 +34,31 @@ class Sheet:
         if not key_content:
             raise FileNotFoundError("Service account key content not found in environment variable!")
 
-        key_path = "service_account.json"
-        with open(key_path, "w") as f:
-            f.write(key_content)
         scopes = [
             'https://www.googleapis.com/auth/spreadsheets',
             'https://www.googleapis.com/auth/drive'
         ]
-        credentials = Credentials.from_service_account_file(key_path, scopes=scopes)
-        gc = gspread.authorize(credentials)
-        spreadsheet_url = "https://docs.google.com/spreadsheets/d/1leD8qGyOZzmR1fSa7QNgB9GLoRlVrkHqlQrigEOOTcA/edit?gid=0#gid=0"
+        # Parsed in memory: workers started together would otherwise rewrite a shared key file under each other.
+        credentials = Credentials.from_service_account_info(json.loads(key_content), scopes=scopes)
+        self.gc = gspread.authorize(credentials)
+        self.set_session(self.gc.http_client.session)
+        self.worksheets = {}
+        self.headers = {}
+        # Opening the spreadsheet costs a metadata round-trip, so it waits for first use.
+        self._spreadsheet = None
+
+    @property
+    def spreadsheet(self):
+        if self._spreadsheet is None:
+            self._spreadsheet = self.open_spreadsheet()
+        return self._spreadsheet
+
+    def open_spreadsheet(self):
         retries = 10
         delay = 60
         for attempt in range(retries):
             try:
-                self.spreadsheet = gc.open_by_url(spreadsheet_url)
-                break
+                return self.gc.open_by_url(SPREADSHEET_URL)
             except gspread.exceptions.APIError as e:
                 if any(code in str(e) for code in ["429", "500", "502", "503", "504"]):
                     print(
@@ -40,8 +71,20 @@ class Sheet:
             raise Exception("Failed to open spreadsheet after multiple attempts due to API errors.")
 
     @staticmethod
-    def set_driver():
+    def set_session(session):
+        # One pooled keep-alive session for every Sheets call in the process.
+        # Connection-level failures are retried here, API errors stay with the callers.
+        retry = Retry(total=3, connect=3, read=0, status=0, backoff_factor=1)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry, pool_block=False)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+
+    @staticmethod
+    def set_driver(profile=None, light=None, proxy=None):
         # set options and driver settings
+        # LIGHT_PROFILE=0 falls back to the plain profile, e.g. to compare page times.
+        light = os.environ.get("LIGHT_PROFILE", "1") != "0" if light is None else light
         user_agent = f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36"
         options = webdriver.ChromeOptions()
         options.add_argument(f"user-agent={user_agent}")
@@ -50,8 +93,135 @@ class Sheet:
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-extensions")
         options.add_argument('--start-maximized')
+        if light:
+            options.page_load_strategy = "eager"
+            options.add_argument("--blink-settings=imagesEnabled=false")
+            options.add_argument("--disable-background-networking")
+            options.add_argument("--disable-component-update")
+            options.add_argument("--disable-default-apps")
+            options.add_argument("--disable-sync")
+            options.add_argument("--metrics-recording-only")
+            options.add_argument("--no-first-run")
+            options.add_argument("--mute-audio")
+            options.add_argument("--disk-cache-size=104857600")
+            if profile:
+                # One profile per worker: Chrome locks a user-data dir, and a worker restarted on the same
+                # host reuses the Salesforce static resources its last browser cached.
+                user_data_dir = os.path.abspath(os.path.join(PROFILE_DIR, profile))
+                os.makedirs(user_data_dir, exist_ok=True)
+                # Older runs kept profiles in cache/chrome; drop that copy so the cache stops carrying it.
+                shutil.rmtree(LEGACY_PROFILE_DIR, ignore_errors=True)
+                # A browser that crashed leaves its lock behind.
+                for lock in ("SingletonLock", "SingletonCookie", "SingletonSocket"):
+                    if os.path.lexists(os.path.join(user_data_dir, lock)):
+                        os.remove(os.path.join(user_data_dir, lock))
+                options.add_argument(f"--user-data-dir={user_data_dir}")
+        if proxy:
+            options.add_argument(f"--proxy-server={proxy}")
+        if os.environ.get("AURA_CAPTURE") == "1":
+            # DevTools network events for AuraCapture, read back through get_log("performance").
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
         driver = webdriver.Chrome(options=options)
+        if light:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
         return driver
 
+    def lazy_driver(self, page_load_timeout=None, profile=None):
+        profile = profile or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "default"
+        return LazyDriver(lambda proxy: self.set_driver(profile, proxy=proxy), page_load_timeout,
+                          PolitenessScheduler.from_env(), load_proxy_pool())
+
+    def peek(self, range_name):
+        # Plain values read that skips opening the spreadsheet, for cheap pre-flight checks.
+        response = self.gc.http_client.values_get(extract_id_from_url(SPREADSHEET_URL), range_name)
+        return response.get("values", [])
+
     def get_worksheet(self, sheet_name):
-        return self.spreadsheet.worksheet(sheet_name)
+        if sheet_name not in self.worksheets:
+            self.worksheets[sheet_name] = self.spreadsheet.worksheet(sheet_name)
+        return self.worksheets[sheet_name]
+
+    def get_header(self, worksheet, refresh=False):
+        if refresh or worksheet.title not in self.headers:
+            self.headers[worksheet.title] = worksheet.row_values(1)
+        return self.headers[worksheet.title]
+
+    def set_header(self, worksheet, headers):
+        self.headers[worksheet.title] = list(headers)
+
+
+class LazyDriver:
+    def __init__(self, factory, page_load_timeout=None, politeness=None, proxies=None, attempts=3):
+        self.factory = factory
+        self.page_load_timeout = page_load_timeout
+        self.politeness = politeness
+        self.proxies = proxies
+        self.proxy = proxies.next() if proxies else None
+        self.attempts = attempts
+        self.instance = None
+        self.page_times = []
+
+    def get_instance(self):
+        if self.instance is None:
+            self.instance = self.factory(self.proxy)
+            if self.page_load_timeout:
+                self.instance.set_page_load_timeout(self.page_load_timeout)
+        return self.instance
+
+    def __getattr__(self, name):
+        return getattr(self.get_instance(), name)
+
+    def set_page_load_timeout(self, seconds):
+        # Kept for the next browser too, and applied now if one is already running; does not start Chrome.
+        self.page_load_timeout = seconds
+        if self.instance is not None:
+            self.instance.set_page_load_timeout(seconds)
+
+    def get(self, url):
+        for attempt in range(self.attempts):
+            # Waiting for the host's turn is not page time.
+            if self.politeness:
+                self.politeness.wait(url)
+            start = time.time()
+            try:
+                result = self.get_instance().get(url)
+            finally:
+                self.page_times.append(time.time() - start)
+            if not self.politeness or not self.politeness.check(self.instance, url):
+                return result
+            if attempt < self.attempts - 1:
+                self.rotate()
+        print(f"Still throttled on {url} after {self.attempts} attempts.")
+        return result
+
+    def rotate(self):
+        # A throttled session moves to the next proxy; without a pool the host's cooldown is the only remedy.
+        if not self.proxies:
+            return
+        self.proxies.report_bad(self.proxy)
+        self.proxy = self.proxies.next()
+        print(f"Restarting the browser on proxy {self.proxy or 'none'}.")
+        if self.instance is not None:
+            self.instance.quit()
+            self.instance = None
+
+    def page_stats(self):
+        if not self.page_times:
+            return None
+        times = sorted(self.page_times)
+        return {
+            "pages": len(times),
+            "mean": round(statistics.fmean(times), 2),
+            "p50": round(times[len(times) // 2], 2),
+            "p95": round(times[min(int(len(times) * 0.95), len(times) - 1)], 2),
+        }
+
+    def quit(self):
+        stats = self.page_stats()
+        if stats:
+            profile = "light" if os.environ.get("LIGHT_PROFILE", "1") != "0" else "plain"
+            print(f"[page-time] profile={profile} " + " ".join(f"{key}={value}" for key, value in stats.items()))
+        if self.instance is not None:
+            self.instance.quit()
+            self.instance = None
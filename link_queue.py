@@ -0,0 +1,68 @@
+# link_queue.py
+import fcntl
+import json
+import os
+
+QUEUE_PATH = os.path.join("staging", "link_queue.jsonl")
+# A {"#": postcode} line opens each published batch, so readers can drop a batch a restarted shard sends again.
+BATCH_KEY = "#"
+
+
+class LinkQueue:
+    # Append-only JSON lines on the local disk: link shards publish each postcode's links as soon as it is
+    # scraped, and detail shards read them through link_reader.FileLinkSource. Line order is the shared
+    # RowNum order.
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        self.closed_path = path + ".closed"
+        self.aborted_path = path + ".aborted"
+
+    def reset(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        open(self.path, "w", encoding="utf-8").close()
+        self.reopen()
+
+    def reopen(self):
+        # Resuming a stream: keep the rows, so the detail shards' RowNum still point at the same links.
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        open(self.path, "a", encoding="utf-8").close()
+        for marker in (self.closed_path, self.aborted_path):
+            if os.path.exists(marker):
+                os.remove(marker)
+
+    def close(self):
+        open(self.closed_path, "w", encoding="utf-8").close()
+
+    def abort(self):
+        # The link stage failed: the queue will not be complete, so readers stop waiting and hand off.
+        open(self.aborted_path, "w", encoding="utf-8").close()
+
+    def is_closed(self):
+        return os.path.exists(self.closed_path)
+
+    def is_aborted(self):
+        return os.path.exists(self.aborted_path)
+
+    def publish(self, rows):
+        # rows are PractitionerLink rows: postcode, name, link.
+        lines = []
+        batch = None
+        for row in rows:
+            if not row[2]:
+                continue
+            if row[0] != batch:
+                batch = row[0]
+                lines.append(json.dumps({BATCH_KEY: batch}) + "\n")
+            lines.append(json.dumps({row[2]: row[0]}) + "\n")
+        if not lines:
+            return
+        lines = "".join(lines)
+        with open(self.path, "a", encoding="utf-8") as f:
+            # Twenty shards append here; the lock keeps each batch of lines whole.
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(lines)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
@@ -0,0 +1,153 @@
+# link_reader.py
+import json
+import time
+
+from link_queue import BATCH_KEY
+from sheet_reader import read_columns
+
+
+class SheetLinkSource:
+    # PractitionerLink read a window of rows per call; the first blank link ends the list, as it always has.
+    def __init__(self, sheet, schema, chunk_rows=1000, retries=10, delay=60):
+        self.sheet = sheet
+        self.schema = schema
+        self.chunk_rows = chunk_rows
+        self.retries = retries
+        self.delay = delay
+
+    def aborted(self):
+        return False
+
+    def seek(self, index):
+        # Sheet rows can be addressed directly, so a resumed shard starts reading at its own cursor.
+        return index, index
+
+    def read(self, token):
+        start_row = token + 2
+        delay = self.delay
+        for attempt in range(self.retries):
+            try:
+                rows = read_columns(self.sheet, self.schema, ["Link", "postcode"], start_row,
+                                    start_row + self.chunk_rows - 1)
+                break
+            except Exception:
+                print(f"Read quota error when fetching links. Retrying in {delay} seconds... "
+                      f"(Attempt {attempt + 1}/{self.retries})")
+                time.sleep(delay)
+                delay *= 2
+        else:
+            raise Exception("Failed to fetch the link list after multiple attempts.")
+        items = []
+        for link, postcode in rows:
+            if not link:
+                return items, token + len(items), True
+            items.append({link: postcode})
+        return items, token + len(items), len(rows) < self.chunk_rows
+
+
+class FileLinkSource:
+    # JSON lines of {link: postcode}: the runner's shared link list, or the link queue while it is still open.
+    def __init__(self, path, is_closed=None, is_aborted=None, chunk_bytes=1 << 20):
+        self.path = path
+        self.is_closed = is_closed or (lambda: True)
+        self.aborted = is_aborted or (lambda: False)
+        self.chunk_bytes = chunk_bytes
+
+    def seek(self, index):
+        # Lines have no fixed width, so the reader walks from the top and drops rows before the cursor.
+        # The token also carries the batches seen so far and whether the current one is a repeat.
+        return (0, b"", set(), False), 0
+
+    def read(self, token):
+        offset, partial, batches, repeat = token
+        # Check for the close first, so lines written just before it are still read. An aborted queue ends
+        # the same way, but ShardLinks.complete() then reports the list as cut short.
+        closed = self.is_closed() or self.aborted()
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read(self.chunk_bytes)
+        lines = (partial + data).split(b"\n")
+        partial = lines.pop()
+        items = []
+        for line in lines:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if BATCH_KEY in item:
+                # Every reader skips the same repeated batches, so RowNum still means the same row everywhere.
+                repeat = item[BATCH_KEY] in batches
+                batches.add(item[BATCH_KEY])
+            elif not repeat:
+                items.append(item)
+        done = closed and len(data) < self.chunk_bytes and not partial.strip()
+        return items, (offset + len(data), partial, batches, repeat), done
+
+
+class ListLinkSource:
+    def __init__(self, items):
+        self.items = items
+
+    def aborted(self):
+        return False
+
+    def seek(self, index):
+        return index, index
+
+    def read(self, token):
+        return self.items[token:], max(token, len(self.items)), True
+
+
+class ShardLinks:
+    # One shard's rows of the link list (start, start + stride, ...), read forward a chunk at a time.
+    # Rows of other shards and rows already passed are dropped, so a worker holds at most a chunk of links
+    # however long PractitionerLink grows.
+    def __init__(self, source, start, stride=20, poll=5):
+        self.source = source
+        self.start = start
+        self.stride = stride
+        self.poll = poll
+        self.token, self.loaded = source.seek(start)
+        self.rows = {}
+        self.done = False
+
+    def __len__(self):
+        # Rows known so far; the full length once the source is done.
+        return self.loaded
+
+    def __getitem__(self, row_num):
+        return self.rows[row_num]
+
+    def fetch(self):
+        # True when the read moved the source forward, even if it only covered batch markers or a partial line.
+        previous = self.token
+        items, self.token, self.done = self.source.read(self.token)
+        for offset, item in enumerate(items):
+            row_num = self.loaded + offset
+            if row_num >= self.start and (row_num - self.start) % self.stride == 0:
+                self.rows[row_num] = item
+        self.loaded += len(items)
+        return items or self.token != previous
+
+    def wait_for(self, row_num, timeout=None):
+        # True once row_num is loaded; False when the list ends before it or time runs out.
+        for passed in [number for number in self.rows if number < row_num]:
+            del self.rows[passed]
+        deadline = time.time() + timeout if timeout is not None else None
+        waiting = False
+        while row_num >= self.loaded and not self.done:
+            # Keep reading while the source moves forward; only a read that found nothing new waits.
+            if self.fetch() or self.done:
+                continue
+            if deadline is not None and time.time() >= deadline:
+                return False
+            if not waiting:
+                print(f"Waiting for the link stage to publish row {row_num}...")
+                waiting = True
+            time.sleep(self.poll)
+        return row_num < self.loaded
+
+    def complete(self, row_num):
+        if self.done and self.source.aborted():
+            print("The link stage stopped before publishing every row.")
+            return False
+        return self.done and row_num >= self.loaded
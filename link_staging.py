@@ -0,0 +1,137 @@
+# link_staging.py
+import csv
+import glob
+import os
+import time
+
+import gspread
+
+from google_form_package import Sheet
+from link_queue import LinkQueue
+from sheet_schema import get_schema
+
+# LINK_STAGING=sheet (default) gives every shard its own worksheet, which works across CI runners;
+# LINK_STAGING=file keeps the shards' rows on local disk when they all run on one host.
+STAGING_PREFIX = "PractitionerLink "
+STAGING_DIR = os.path.join("staging", "links")
+RETRY_CODES = ["429", "500", "502", "503", "504"]
+
+
+def with_retries(action, what, retries=10, delay=60):
+    for attempt in range(retries):
+        try:
+            return action()
+        except gspread.exceptions.APIError as e:
+            if any(code in str(e) for code in RETRY_CODES):
+                print(f"API Error ({e}) while {what}. Retry after {delay} seconds... (attempt {attempt + 1}/{retries})")
+                time.sleep(delay)
+                delay *= 2
+            else:
+                raise
+    raise Exception(f"Failed {what} after {retries} attempts.")
+
+
+def staging_mode(mode=None):
+    return mode or os.environ.get("LINK_STAGING", "sheet")
+
+
+class LinkStaging:
+    def __init__(self, web_sheet, shard, mode=None):
+        self.web_sheet = web_sheet
+        self.shard = shard
+        self.mode = staging_mode(mode)
+        self.title = f"{STAGING_PREFIX}{shard}"
+        self.path = os.path.join(STAGING_DIR, f"practitioner_link_{shard}.csv")
+        self.worksheet = None
+        # LINK_QUEUE is set by `runner.py all --stream`, where detail shards consume links as they appear.
+        self.queue = LinkQueue(os.environ["LINK_QUEUE"]) if os.environ.get("LINK_QUEUE") else None
+
+    def sheet(self):
+        if self.worksheet is None:
+            try:
+                self.worksheet = self.web_sheet.get_worksheet(self.title)
+            except gspread.exceptions.WorksheetNotFound:
+                self.worksheet = with_retries(
+                    lambda: self.web_sheet.spreadsheet.add_worksheet(self.title, rows=1000, cols=3),
+                    f"creating {self.title}")
+                self.web_sheet.worksheets[self.title] = self.worksheet
+        return self.worksheet
+
+    def reset(self):
+        if self.mode == "file":
+            os.makedirs(STAGING_DIR, exist_ok=True)
+            open(self.path, "w", encoding="utf-8").close()
+        else:
+            with_retries(self.sheet().clear, f"clearing {self.title}")
+
+    def append(self, rows):
+        if not rows:
+            return
+        if self.mode == "file":
+            os.makedirs(STAGING_DIR, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8", newline="") as f:
+                csv.writer(f).writerows(rows)
+        else:
+            # Only this shard writes here, so the append never waits on the other 19.
+            with_retries(lambda: self.sheet().append_rows(rows, value_input_option="USER_ENTERED"),
+                         f"appending to {self.title}")
+
+    def publish(self, rows):
+        if self.queue:
+            self.queue.publish(rows)
+
+
+def staged_rows(web_sheet, mode=None):
+    if staging_mode(mode) == "file":
+        rows = []
+        for path in sorted(glob.glob(os.path.join(STAGING_DIR, "practitioner_link_*.csv"))):
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                rows.extend(csv.reader(f))
+        return rows
+    titles = [worksheet.title for worksheet in with_retries(web_sheet.spreadsheet.worksheets, "listing worksheets")
+              if worksheet.title.startswith(STAGING_PREFIX)]
+    if not titles:
+        return []
+    # Every shard's sheet in one read.
+    response = with_retries(
+        lambda: web_sheet.spreadsheet.values_batch_get([f"'{title}'!A:C" for title in sorted(titles)]),
+        "reading the staging sheets")
+    return [row for value_range in response.get("valueRanges", []) for row in value_range.get("values", [])]
+
+
+def postcode_order(row):
+    return (0, int(row[0]), "") if row[0].isdigit() else (1, 0, row[0])
+
+
+def merge_links(web_sheet, mode=None):
+    seen = set()
+    rows = []
+    for row in staged_rows(web_sheet, mode):
+        row = (list(row) + ["", "", ""])[:3]
+        if not row[2] or (row[0], row[2]) in seen:
+            continue
+        seen.add((row[0], row[2]))
+        rows.append(row)
+    if not rows:
+        print("No staged links to merge; PractitionerLink is left as it is.")
+        return 0
+    # Stable sort, so each postcode keeps the order its result pages came in.
+    rows.sort(key=postcode_order)
+    link_sheet = web_sheet.get_worksheet("PractitionerLink")
+    values = [get_schema("PractitionerLink").header() + ["Finished Scrapping"]] + rows
+    with_retries(link_sheet.clear, "clearing PractitionerLink")
+    if link_sheet.row_count < len(values):
+        with_retries(lambda: link_sheet.add_rows(len(values) - link_sheet.row_count), "growing PractitionerLink")
+    with_retries(lambda: link_sheet.update(values, "A1", value_input_option="USER_ENTERED"),
+                 "writing PractitionerLink")
+    web_sheet.set_header(link_sheet, values[0])
+    print(f"Merged {len(rows)} links into PractitionerLink.")
+    return len(rows)
+
+
+def main():
+    merge_links(Sheet())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# page_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import requests
+
+CACHE_DIR = "cache"
+# The scheduled crawl runs every CYCLE_DAYS; entries stay fresh for two thirds of that, so restarts and
+# retries inside a run skip the page and the next run revalidates it.
+CYCLE_SECONDS = float(os.environ.get("CYCLE_DAYS", 3)) * 86400
+DEFAULT_MAX_AGE = CYCLE_SECONDS * 2 / 3
+# A light probe hashes the start of a plain GET when the server sends no ETag or Last-Modified.
+PROBE_BYTES = 65536
+# Payloads stay in SQLite and are read per key; only this metadata is held in memory.
+META = ["hash", "etag", "last_modified", "probe", "checked"]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, hash TEXT, etag TEXT, last_modified TEXT, probe TEXT, checked REAL, payload TEXT
+)
+"""
+
+
+def digest(values):
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    def __init__(self, name, max_age=DEFAULT_MAX_AGE, save_every=20, politeness=None):
+        self.path = os.path.join(CACHE_DIR, f"{name}.db")
+        self.max_age = max_age
+        self.save_every = save_every
+        # Revalidation requests wait for the host's turn like the browser's page loads do.
+        self.politeness = politeness
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Workers on one host share the file; the timeout waits out another worker's write.
+        self.db = sqlite3.connect(self.path, timeout=60)
+        self.db.execute(SCHEMA)
+        self.import_json(os.path.join(CACHE_DIR, f"{name}.json"))
+        self.pending = {}
+        self.entries = self.read()
+        self.index()
+        self.dirty = 0
+
+    def import_json(self, legacy_path):
+        # Caches restored from before the move to SQLite: load once, then drop the JSON file.
+        if not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            legacy = {}
+        self.write([(key, entry, entry.get("payload")) for key, entry in legacy.items()])
+        try:
+            os.remove(legacy_path)
+        except OSError:
+            # Another worker moved it first.
+            pass
+        print(f"Moved {len(legacy)} cached entries from {legacy_path} to {self.path}.")
+
+    def index(self):
+        # (kind, value) -> keys carrying it, so a shared validator is one lookup.
+        self.by_validator = {}
+        for key, entry in self.entries.items():
+            self.add_validators(key, entry)
+
+    def add_validators(self, key, entry):
+        for kind in ("etag", "probe"):
+            if entry.get(kind):
+                self.by_validator.setdefault((kind, entry[kind]), set()).add(key)
+
+    def drop_validators(self, key, entry):
+        for kind in ("etag", "probe"):
+            keys = self.by_validator.get((kind, entry.get(kind)))
+            if keys:
+                keys.discard(key)
+
+    def read(self):
+        rows = self.db.execute(f"SELECT key, {', '.join(META)} FROM entries")
+        return {row[0]: dict(zip(META, row[1:])) for row in rows}
+
+    def payload(self, key):
+        if key in self.pending and self.pending[key] is not None:
+            return self.pending[key]
+        row = self.db.execute("SELECT payload FROM entries WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return dict(entry, payload=self.payload(key))
+
+    def payloads(self):
+        # Every (key, payload) pair, read a row at a time.
+        for key, payload in self.db.execute("SELECT key, payload FROM entries"):
+            if payload is not None:
+                yield key, json.loads(payload)
+
+    def put(self, key, payload, content_hash=None, etag=None, last_modified=None, probe=None):
+        content_hash = content_hash or digest(payload)
+        old = self.entries.get(key) or {}
+        self.drop_validators(key, old)
+        self.entries[key] = {
+            "hash": content_hash,
+            # Validators describe the page as just fetched; old ones would fail every later revalidation.
+            "etag": etag,
+            "last_modified": last_modified,
+            "probe": probe,
+            "checked": time.time(),
+        }
+        self.add_validators(key, self.entries[key])
+        self.pending[key] = payload
+        self.dirty += 1
+        if self.dirty >= self.save_every:
+            self.save()
+        return old.get("hash") != content_hash
+
+    def shared_validator(self, key, kind, value):
+        # SPA shells hand every URL the same ETag and body; such a validator says nothing about the record.
+        return bool(self.by_validator.get((kind, value), set()) - {key})
+
+    def usable(self, key, etag, last_modified):
+        return bool((etag and not self.shared_validator(key, "etag", etag)) or (not etag and last_modified))
+
+    def request(self, method, url, **kwargs):
+        if self.politeness:
+            self.politeness.wait(url)
+        response = requests.request(method, url, timeout=10, allow_redirects=True, **kwargs)
+        if self.politeness:
+            self.politeness.check_status(url, response.status_code)
+        return response
+
+    def probe(self, url):
+        try:
+            with self.request("GET", url, stream=True) as response:
+                if response.status_code != 200:
+                    return None
+                body = b""
+                for chunk in response.iter_content(8192):
+                    body += chunk
+                    if len(body) >= PROBE_BYTES:
+                        break
+        except requests.RequestException:
+            return None
+        return hashlib.sha1(body[:PROBE_BYTES]).hexdigest()
+
+    def revalidate(self, entry, url):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            return self.request("HEAD", url, headers=headers).status_code == 304
+        except requests.RequestException:
+            return False
+
+    def fresh(self, key, url=None):
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        if time.time() - (entry.get("checked") or 0) < self.max_age:
+            return self.payload(key)
+        if not url:
+            return None
+        if self.usable(key, entry.get("etag"), entry.get("last_modified")):
+            unchanged = self.revalidate(entry, url)
+        elif entry.get("probe") and not self.shared_validator(key, "probe", entry["probe"]):
+            unchanged = self.probe(url) == entry["probe"]
+        else:
+            return None
+        if not unchanged:
+            return None
+        entry["checked"] = time.time()
+        # Only the check time changed; the stored payload stays as it is.
+        self.pending.setdefault(key, None)
+        self.dirty += 1
+        return self.payload(key)
+
+    def validators(self, key, url):
+        # ETag and Last-Modified when the server gives usable ones, otherwise a light-probe hash.
+        try:
+            headers = self.request("HEAD", url).headers
+        except requests.RequestException:
+            return None, None, None
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if self.usable(key, etag, last_modified):
+            return etag, last_modified, None
+        return etag, last_modified, self.probe(url)
+
+    def write(self, rows):
+        # rows are (key, metadata, payload); payload None updates the metadata only. Another worker may
+        # have saved the same key meanwhile, so the newest check wins.
+        with self.db:
+            for key, entry, payload in rows:
+                values = [entry.get(field) for field in META]
+                if payload is None:
+                    self.db.execute(
+                        f"UPDATE entries SET {', '.join(f'{field} = ?' for field in META)} "
+                        "WHERE key = ? AND IFNULL(checked, 0) <= ?", values + [key, entry.get("checked") or 0])
+                    continue
+                self.db.execute(
+                    f"INSERT INTO entries (key, {', '.join(META)}, payload) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    f"ON CONFLICT(key) DO UPDATE SET {', '.join(f'{field} = excluded.{field}' for field in META)}, "
+                    "payload = excluded.payload WHERE IFNULL(entries.checked, 0) <= IFNULL(excluded.checked, 0)",
+                    [key] + values + [json.dumps(payload, ensure_ascii=False)])
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.write([(key, self.entries[key], payload) for key, payload in self.pending.items()])
+        self.pending = {}
+        # Pick up what the other workers on this host have saved.
+        self.entries = self.read()
+        self.index()
+        self.dirty = 0
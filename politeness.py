@@ -0,0 +1,225 @@
+# politeness.py
+import fcntl
+import importlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import WebDriverException
+
+# Shared by the workers of one run, outside cache/ so actions/cache never carries a slowdown into the next run;
+# POLITENESS_STATE_DIR overrides.
+STATE_DIR = os.environ.get("POLITENESS_STATE_DIR") or os.path.join(tempfile.gettempdir(), "practitioner-politeness")
+LEGACY_STATE_DIR = os.path.join("cache", "politeness")
+# A host left alone this long starts again from its configured rate.
+STATE_TTL = 3600
+# Requests per second and burst per host; HOST_LIMITS="host=qps:burst,..." overrides or adds hosts.
+DEFAULT_LIMITS = {"bams.vba.vic.gov.au": (1.0, 3), "www.google.com": (0.5, 2)}
+# Phrases of throttling and bot-check pages, matched against the title and the top of the page text.
+BLOCK_MARKERS = ["too many requests", "service unavailable", "unusual traffic", "rate limit exceeded",
+                 "verify you are a human", "are you a robot", "not a robot"]
+STATUS_TITLE = re.compile(r"\b(429|503)\b")
+MAX_SLOWDOWN = 32
+
+
+def parse_limits(text):
+    limits = dict(DEFAULT_LIMITS)
+    for item in (text or "").split(","):
+        host, _, rate = item.strip().partition("=")
+        if not host or not rate:
+            continue
+        qps, _, burst = rate.partition(":")
+        limits[host] = (float(qps), int(burst or 1))
+    return limits
+
+
+def block_reason(driver):
+    try:
+        url = driver.current_url
+        title = driver.title or ""
+        text = driver.execute_script("return document.body ? document.body.innerText.slice(0, 500) : ''") or ""
+    except WebDriverException:
+        return None
+    if "/sorry/" in url:
+        return "captcha"
+    status = STATUS_TITLE.search(title)
+    if status:
+        return f"HTTP {status.group(1)}"
+    page = f"{title} {text}".lower()
+    for marker in BLOCK_MARKERS:
+        if marker in page:
+            return marker
+    return None
+
+
+class HostBucket:
+    # Token bucket for one host, kept in a small locked file so every worker on this machine shares it.
+    def __init__(self, host, qps, burst, state_dir=STATE_DIR):
+        self.host = host
+        self.qps = qps
+        self.burst = burst
+        self.path = os.path.join(state_dir, f"{host}.json")
+
+    def update(self, change):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                if now - state.get("updated", now) > STATE_TTL:
+                    state = {}
+                state.setdefault("tokens", self.burst)
+                state.setdefault("updated", now)
+                state.setdefault("slowdown", 1.0)
+                state.setdefault("until", 0)
+                rate = self.qps / state["slowdown"]
+                state["tokens"] = min(self.burst, state["tokens"] + max(0.0, now - state["updated"]) * rate)
+                state["updated"] = now
+                result = change(state, now, rate)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def take(state, now, rate):
+        # Seconds to wait before asking again, or 0 once a token is taken.
+        if now < state["until"]:
+            return state["until"] - now
+        if state["tokens"] >= 1:
+            state["tokens"] -= 1
+            return 0
+        return (1 - state["tokens"]) / rate
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            wait = self.update(self.take)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def penalise(self, cooldown):
+        def change(state, now, rate):
+            state["slowdown"] = min(state["slowdown"] * 2, MAX_SLOWDOWN)
+            state["until"] = max(state["until"], now + cooldown * state["slowdown"])
+            state["tokens"] = 0
+            return state["slowdown"]
+        return self.update(change)
+
+    def recover(self):
+        def change(state, now, rate):
+            # Ease back towards the configured rate, a small step per clean page.
+            state["slowdown"] = max(1.0, state["slowdown"] * 0.95)
+            return state["slowdown"]
+        return self.update(change)
+
+
+class PolitenessScheduler:
+    def __init__(self, limits=None, cooldown=30, state_dir=STATE_DIR):
+        self.limits = DEFAULT_LIMITS if limits is None else limits
+        self.cooldown = cooldown
+        self.state_dir = state_dir
+        self.buckets = {}
+
+    @classmethod
+    def from_env(cls):
+        # POLITENESS=0 turns pacing off; THROTTLE_COOLDOWN is the base pause after a block, in seconds.
+        if os.environ.get("POLITENESS") == "0":
+            return None
+        # Older runs kept the state in cache/politeness; drop it so the cache stops restoring it.
+        shutil.rmtree(LEGACY_STATE_DIR, ignore_errors=True)
+        return cls(parse_limits(os.environ.get("HOST_LIMITS")), float(os.environ.get("THROTTLE_COOLDOWN", 30)))
+
+    def bucket(self, url):
+        host = urlsplit(url).hostname or ""
+        if host not in self.limits:
+            return None
+        if host not in self.buckets:
+            qps, burst = self.limits[host]
+            self.buckets[host] = HostBucket(host, qps, burst, self.state_dir)
+        return self.buckets[host]
+
+    def wait(self, url):
+        bucket = self.bucket(url)
+        return bucket.acquire() if bucket else 0.0
+
+    def check(self, driver, url):
+        # Only paced hosts are checked; the reason is returned when the page looks throttled.
+        bucket = self.bucket(url)
+        if not bucket:
+            return None
+        return self.record(bucket, block_reason(driver))
+
+    def check_status(self, url, status):
+        # Plain HTTP requests, such as cache revalidation, report throttling through the status code.
+        bucket = self.bucket(url)
+        if not bucket:
+            return None
+        return self.record(bucket, f"HTTP {status}" if status in (429, 503) else None)
+
+    def record(self, bucket, reason):
+        if reason:
+            slowdown = bucket.penalise(self.cooldown)
+            print(f"[politeness] {bucket.host} throttled ({reason}); running at 1/{slowdown:g} of "
+                  f"{bucket.qps} qps for now.")
+        else:
+            bucket.recover()
+        return reason
+
+
+class ProxyPool:
+    # Hands out a proxy for each new browser session. Point PROXY_POOL at a subclass to plug in another source.
+    def next(self):
+        return None
+
+    def report_bad(self, proxy):
+        pass
+
+
+class RotatingProxyPool(ProxyPool):
+    def __init__(self, proxies, rest=600):
+        self.proxies = list(proxies)
+        self.rest = rest
+        self.benched = {}
+        # Shards start at different places, so they do not all share the first proxy.
+        self.position = random.randrange(len(self.proxies)) if self.proxies else 0
+
+    def next(self):
+        if not self.proxies:
+            return None
+        now = time.time()
+        for _ in range(len(self.proxies)):
+            proxy = self.proxies[self.position % len(self.proxies)]
+            self.position += 1
+            if self.benched.get(proxy, 0) <= now:
+                return proxy
+        # Every proxy is resting: use the one that comes back first.
+        return min(self.proxies, key=lambda proxy: self.benched.get(proxy, 0))
+
+    def report_bad(self, proxy):
+        if proxy:
+            self.benched[proxy] = time.time() + self.rest
+
+
+def load_proxy_pool():
+    # PROXY_POOL="module:callable" builds a custom pool; PROXIES="scheme://host:port,..." rotates a fixed list.
+    spec = os.environ.get("PROXY_POOL")
+    if spec:
+        module, _, name = spec.partition(":")
+        return getattr(importlib.import_module(module), name or "pool")()
+    proxies = [proxy.strip() for proxy in os.environ.get("PROXIES", "").split(",") if proxy.strip()]
+    return RotatingProxyPool(proxies) if proxies else None
@@ -0,0 +1,106 @@
+# postcode_catalogue.py
+import sys
+
+import numpy as np
+
+from google_form_package import Sheet
+from sheet_reader import read_columns
+from sheet_schema import get_schema
+
+POSTCODE_FILE = "refined_db.csv"
+# Postcodes are four digits, so a 10000-slot table answers lookups without hashing or searching.
+POSTCODE_SLOTS = 10000
+
+
+def parse_postcodes(values):
+    # Keep four-digit numeric entries, deduped and sorted; also return how many were rejected.
+    tokens = np.char.strip(np.asarray(values, dtype=str))
+    if not tokens.size:
+        return np.zeros(0, dtype=np.uint16), 0
+    valid = np.char.isdigit(tokens) & (np.char.str_len(tokens) == 4)
+    return np.unique(tokens[valid].astype(np.uint16)), int((~valid).sum())
+
+
+def postcode_number(postcode):
+    try:
+        number = int(postcode)
+    except (TypeError, ValueError):
+        return -1
+    return number if 0 <= number < POSTCODE_SLOTS else -1
+
+
+class PostcodeCatalogue:
+    def __init__(self, codes, suburbs=None):
+        self.codes = np.asarray(codes, dtype=np.uint16)
+        # slots[postcode] is the postcode's position in codes, or -1.
+        self.slots = np.full(POSTCODE_SLOTS, -1, dtype=np.int32)
+        self.slots[self.codes] = np.arange(len(self.codes), dtype=np.int32)
+        self.suburbs = suburbs or {}
+        self.tracked_only = np.zeros(0, dtype=np.uint16)
+
+    @classmethod
+    def load(cls, path=POSTCODE_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line for line in f.read().splitlines() if line.strip()]
+        codes, rejected = parse_postcodes(lines)
+        duplicates = len(lines) - rejected - len(codes)
+        if rejected or duplicates:
+            print(f"{path}: skipped {rejected} invalid and {duplicates} duplicate postcodes.")
+        return cls(codes)
+
+    def merge_suburbs(self, web_sheet):
+        # Suburb names come from "VIC Suburbs - Tracking"; postcodes only the sheet knows are kept aside,
+        # not crawled, so the search list stays what refined_db.csv says.
+        base_sheet = web_sheet.get_worksheet("VIC Suburbs - Tracking")
+        schema = get_schema("VIC Suburbs - Tracking", web_sheet.get_header(base_sheet))
+        suburbs = {}
+        for suburb, postcode in read_columns(base_sheet, schema, ["Suburb", "Postcode"]):
+            number = postcode_number(postcode.strip()) if len(postcode.strip()) == 4 else -1
+            if suburb.strip() and number >= 0:
+                suburbs.setdefault(number, []).append(suburb.strip())
+        self.suburbs = suburbs
+        tracked = np.fromiter(suburbs, dtype=np.uint16, count=len(suburbs))
+        self.tracked_only = np.setdiff1d(tracked, self.codes)
+        untracked = int((~np.isin(self.codes, tracked)).sum())
+        if len(self.tracked_only) or untracked:
+            print(f"{len(self.tracked_only)} tracked postcodes are not in the search list; "
+                  f"{untracked} searched postcodes have no tracked suburb.")
+        return self
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, postcode):
+        return self.index(postcode) >= 0
+
+    def index(self, postcode):
+        number = postcode_number(postcode)
+        return int(self.slots[number]) if number >= 0 else -1
+
+    def suburbs_for(self, postcode):
+        return self.suburbs.get(postcode_number(postcode), [])
+
+    def between(self, low, high):
+        # Postcodes in [low, high], as a view of the sorted array.
+        start = np.searchsorted(self.codes, int(low), side="left")
+        end = np.searchsorted(self.codes, int(high), side="right")
+        return self.codes[start:end]
+
+    def shard(self, index, count=20):
+        # Same stride the link shards walk with UrlNum.
+        return self.codes[index::count]
+
+    def queries(self, codes=None):
+        return [f"{code:04d}" for code in (self.codes if codes is None else codes).tolist()]
+
+
+def main():
+    catalogue = PostcodeCatalogue.load().merge_suburbs(Sheet())
+    codes = catalogue.between(sys.argv[1], sys.argv[2]) if len(sys.argv) > 2 else catalogue.codes
+    print(f"{len(codes)} of {len(catalogue)} postcodes.")
+    for postcode in catalogue.queries(codes):
+        print(f"{postcode}: {', '.join(catalogue.suburbs_for(postcode)) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
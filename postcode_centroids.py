@@ -0,0 +1,131 @@
+# postcode_centroids.py
+import csv
+import os
+import statistics
+from array import array
+from bisect import bisect_left, bisect_right
+
+from address_parser import clean, parse_address
+from google_form_package import Sheet
+from page_cache import PageCache
+from postcode_catalogue import POSTCODE_FILE, PostcodeCatalogue
+from sheet_reader import read_columns
+from sheet_schema import get_schema
+
+CENTROID_FILE = "postcode_centroids.csv"
+
+
+class CentroidTable:
+    def __init__(self, path=CENTROID_FILE):
+        # Parallel arrays sorted by (postcode, suburb); "" is the postcode-wide centroid.
+        self.postcodes = array("H")
+        self.suburbs = []
+        self.lats = array("d")
+        self.longs = array("d")
+        self.load(path)
+        # GEOCODE_MODE=centroid skips Maps entirely and answers from this table, so it needs a built one.
+        self.low_precision = os.environ.get("GEOCODE_MODE") == "centroid" and len(self) > 0
+        if os.environ.get("GEOCODE_MODE") == "centroid" and not self.low_precision:
+            print("GEOCODE_MODE=centroid needs a centroid table; run postcode_centroids.py first. Using Maps.")
+
+    def load(self, path):
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                rows = [row for row in csv.DictReader(f) if row.get("postcode", "").isdigit()]
+        except OSError:
+            print(f"No centroid table at {path}; the centroid fallback is off.")
+            return
+        if not rows:
+            print(f"{path} has no centroids; the centroid fallback is off.")
+            return
+        rows.sort(key=lambda row: (int(row["postcode"]), row["suburb"]))
+        for row in rows:
+            self.postcodes.append(int(row["postcode"]))
+            self.suburbs.append(row["suburb"])
+            self.lats.append(float(row["lat"]))
+            self.longs.append(float(row["long"]))
+
+    def __len__(self):
+        return len(self.postcodes)
+
+    def lookup(self, postcode, suburb=""):
+        if not str(postcode).isdigit():
+            return None
+        postcode = int(postcode)
+        start = bisect_left(self.postcodes, postcode)
+        end = bisect_right(self.postcodes, postcode, lo=start)
+        if start == end:
+            return None
+        suburb = clean(suburb)
+        # The postcode-wide row sorts first; prefer an exact suburb within the postcode's range.
+        match = start + bisect_left(self.suburbs[start:end], suburb) if suburb else start
+        if match >= end or self.suburbs[match] != suburb:
+            match = start
+        return f"{self.lats[match]:.6f}", f"{self.longs[match]:.6f}"
+
+    def lookup_address(self, address):
+        parsed = parse_address(address)
+        return self.lookup(parsed["postcode"], parsed["suburb"])
+
+    def fallback(self, address):
+        found = self.lookup_address(address) if len(self) else None
+        if found:
+            print("Using the postcode centroid for lat/long.")
+            return found
+        return "No lat given", "No long given"
+
+
+def known_postcodes(web_sheet, path=POSTCODE_FILE):
+    catalogue = PostcodeCatalogue.load(path).merge_suburbs(web_sheet)
+    postcodes = set(catalogue.queries()) | set(catalogue.queries(catalogue.tracked_only))
+    suburbs = {f"{code:04d}": {clean(suburb) for suburb in names} for code, names in catalogue.suburbs.items()}
+    return postcodes, suburbs
+
+
+def collect_points(web_sheet):
+    points = []
+    detail_sheet = web_sheet.get_worksheet("PractitionerDetail")
+    schema = get_schema("PractitionerDetail", web_sheet.get_header(detail_sheet))
+    for address, lat, long in read_columns(detail_sheet, schema, ["Business address", " lat", "long"]):
+        points.append((address, lat, long))
+    for key, payload in PageCache("geocodes").payloads():
+        points.append((key, payload[0], payload[1]))
+    return points
+
+
+def build(web_sheet, path=CENTROID_FILE):
+    # Centroids are medians of the coordinates Maps already returned for each postcode and suburb.
+    postcodes, suburbs = known_postcodes(web_sheet)
+    samples = {}
+    for address, lat, long in collect_points(web_sheet):
+        try:
+            point = (float(lat), float(long))
+        except (TypeError, ValueError):
+            continue
+        parsed = parse_address(address)
+        if parsed["postcode"] not in postcodes:
+            continue
+        samples.setdefault((parsed["postcode"], ""), []).append(point)
+        if parsed["suburb"] in suburbs.get(parsed["postcode"], ()):
+            samples.setdefault((parsed["postcode"], parsed["suburb"]), []).append(point)
+
+    rows = []
+    for (postcode, suburb), points in sorted(samples.items()):
+        lat = statistics.median(point[0] for point in points)
+        long = statistics.median(point[1] for point in points)
+        rows.append([postcode, suburb, f"{lat:.6f}", f"{long:.6f}", len(points)])
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["postcode", "suburb", "lat", "long", "samples"])
+        writer.writerows(rows)
+    covered = len({row[0] for row in rows})
+    print(f"Wrote {len(rows)} centroids covering {covered}/{len(postcodes)} postcodes to {path}.")
+    return rows
+
+
+def main():
+    build(Sheet())
+
+
+if __name__ == "__main__":
+    main()
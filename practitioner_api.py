@@ -0,0 +1,206 @@
+# practitioner_api.py
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from detail_writer import FIELD_COUNT
+from practitioner_store import DB_PATH, PractitionerStore
+from sheet_schema import get_schema
+from spatial_index import INDEX_DIR, SpatialIndex
+
+FIELDS = get_schema("PractitionerDetail").columns[:FIELD_COUNT]
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+MAX_LIMIT = 200
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def present(record):
+    details = json.loads(record.get("data") or "[]")
+    return {
+        "name": record["name"], "category": record["category"], "address": record["address"],
+        "registration": record["registration"], "status": record["status"], "postcode": record["postcode"],
+        "suburb": record["suburb"], "lat": record["lat"], "long": record["long"], "link": record["link"],
+        "details": dict(zip(FIELDS, details)),
+    }
+
+
+def number(params, name, default=None, cast=float):
+    value = params.get(name, [None])[0]
+    if value in (None, ""):
+        if default is None:
+            raise ApiError(400, f"'{name}' is required")
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be a number")
+
+
+def page_size(params, name, default):
+    # SQLite reads LIMIT -1 as "no limit", so anything below 1 is refused rather than passed through.
+    value = number(params, name, default, int)
+    if value < 1:
+        raise ApiError(400, f"'{name}' must be a positive number")
+    return min(value, MAX_LIMIT)
+
+
+class PractitionerApi:
+    def __init__(self, db_path=DB_PATH, index_dir=INDEX_DIR, cache_size=1024):
+        self.db_path = db_path
+        self.index_dir = index_dir
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.version = None
+        self.store = None
+        self.spatial = None
+        self.reload()
+
+    def index_version(self):
+        paths = [self.db_path, os.path.join(self.index_dir, "spatial.json")]
+        return tuple(os.path.getmtime(path) if os.path.exists(path) else 0 for path in paths)
+
+    def reload(self):
+        # Indexes are rebuilt offline; pick up a new build and drop every cached response.
+        version = self.index_version()
+        if version == self.version:
+            return
+        if self.store:
+            self.store.close()
+        self.store = PractitionerStore(self.db_path, readonly=True)
+        try:
+            self.spatial = SpatialIndex.load(self.index_dir)
+        except OSError:
+            print(f"No spatial index in {self.index_dir}; /near is unavailable.")
+            self.spatial = None
+        self.cache.clear()
+        self.version = version
+        print(f"Loaded {self.store.count()} practitioners and {len(self.spatial or [])} geocoded points.")
+
+    def route(self, path, params):
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        if parts == ["health"]:
+            return {"practitioners": self.store.count(), "geocoded": len(self.spatial or [])}
+        if len(parts) == 2 and parts[0] == "practitioners":
+            found = self.store.by_registration(parts[1])
+            if not found:
+                raise ApiError(404, f"No practitioner with registration number {parts[1]}")
+            return {"results": [present(record) for record in found]}
+        if parts == ["search"]:
+            limit = page_size(params, "limit", 20)
+            offset = number(params, "offset", 0, int)
+            if offset < 0:
+                raise ApiError(400, "'offset' must not be negative")
+            results = self.store.search(
+                params.get("q", [""])[0], category=params.get("category", [None])[0],
+                status=params.get("status", [None])[0], postcode=params.get("postcode", [None])[0],
+                suburb=params.get("suburb", [None])[0], limit=limit, offset=offset,
+                fuzzy=params.get("fuzzy", [""])[0] in ("1", "true"))
+            return {"results": [present(record) for record in results]}
+        if parts == ["near"]:
+            if self.spatial is None:
+                raise ApiError(404, "Spatial index is not built")
+            lat, long = number(params, "lat"), number(params, "long")
+            if "km" in params:
+                matches = self.spatial.radius(lat, long, number(params, "km"))
+            else:
+                matches = self.spatial.nearest(lat, long, page_size(params, "k", 10))
+            category = params.get("category", [""])[0].lower()
+            distances = dict(matches)
+            results = []
+            for record in self.store.by_rows(row_num for row_num, _ in matches):
+                if category and category not in (record["category"] or "").lower():
+                    continue
+                results.append(dict(present(record), distance_km=round(distances[record["row"]], 3)))
+            return {"results": results}
+        raise ApiError(404, f"Unknown endpoint /{'/'.join(parts)}")
+
+    def respond(self, target):
+        self.reload()
+        cached = self.cache.get(target)
+        if cached:
+            self.cache.move_to_end(target)
+            return cached
+        url = urlsplit(target)
+        try:
+            status, payload = 200, self.route(url.path, parse_qs(url.query))
+        except ApiError as e:
+            status, payload = e.status, {"error": str(e)}
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        response = (status, body, f'"{hashlib.sha1(body).hexdigest()}"')
+        if status == 200:
+            self.cache[target] = response
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return response
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                method, target, version = (request_line.decode("latin-1").split() + ["", "", ""])[:3]
+                if method not in ("GET", "HEAD"):
+                    status, body, etag = 405, b'{"error": "Only GET is supported"}', None
+                else:
+                    try:
+                        status, body, etag = self.respond(target)
+                    except Exception as e:
+                        print(f"Request {target} failed: {e}")
+                        status, body, etag = 500, b'{"error": "Internal error"}', None
+                if etag and headers.get("if-none-match") == etag:
+                    status, body = 304, b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}", "Content-Type: application/json; charset=utf-8",
+                        f"Content-Length: {len(body)}", "Cache-Control: public, max-age=300",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if etag:
+                    head.append(f"ETag: {etag}")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(api, host, port):
+    server = await asyncio.start_server(api.handle, host, port)
+    print(f"Serving practitioners on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the local practitioner indexes over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    args = parser.parse_args()
+    api = PractitionerApi(os.path.join(args.index_dir, os.path.basename(DB_PATH)), args.index_dir)
+    asyncio.run(serve(api, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,39 @@
 # practitioner_detail_03.py
+import os
 import re
 import time
 from urllib.parse import quote
 
 import gspread
 from requests.exceptions import ConnectionError
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+from address_parser import address_key
+from aura_capture import AuraCapture, detail_from_actions
+from dead_letter import DeadLetterStore
+from detail_writer import DetailWriter, ensure_detail_sheet
 from google_form_package import Sheet
-from process_handler import ProcessHandler
+from link_queue import LinkQueue
+from link_reader import FileLinkSource, ListLinkSource, SheetLinkSource, ShardLinks
+from page_cache import PageCache, digest
+from postcode_centroids import CentroidTable
+from process_handler import ProcessHandler, is_finished
+from progress_bitmap import CompletionBitmap
+from scheduler import DETAIL_POSITIONS, BudgetScheduler, claim_handoff, remaining_rows, steal_tail
+from sheet_schema import get_schema
 
 web_sheet = Sheet()
-driver = web_sheet.set_driver()
-driver.set_page_load_timeout(180)
+driver = web_sheet.lazy_driver(page_load_timeout=180)
 wait = WebDriverWait(driver, 10)
-
-
-def append_row_with_retry(worksheet, data, retries=3, delay=60):
-    for attempt in range(retries):
-        try:
-            worksheet.append_row(data, value_input_option="USER_ENTERED")
-            return
-        except Exception:
-            print(f"Error occurred. Retry after {delay} seconds ({attempt + 1}/{retries})")
-            time.sleep(delay)
-            delay *= 2
-    print(f"Failed to append rows {data} after {retries} attempts.")
-    return
-
-
-def set_detail_sheet(worksheet):
-    worksheet.clear()
-    headers = ["Name", "Category", "Business address", "Contact Details",
-               "Limitations", "Conditions", "Status", "Registration number", "Commenced", "Anniversary",
-               "Expires", "Date registration was suspended, cancelled or surrendered (if applicable)",
-               "Reason for Suspension or Cancellation (if applicable)", "Director Name", "Partnership details", " lat",
-               "long", "postcode"]
-    worksheet.append_row(headers)
-    print("Reset the PractitionerDetail sheet.")
-    return worksheet
+capture = AuraCapture(driver)
+dead_letters = DeadLetterStore(web_sheet)
+page_cache = PageCache("detail_pages", politeness=driver.politeness)
+geocodes = PageCache("geocodes", max_age=90 * 86400)
+centroids = CentroidTable()
+detail_writer = DetailWriter(web_sheet)
 
 
 def wait_for_page_load(wait_driver, timeout=180):
@@ -56,11 +48,20 @@ def wait_for_page_load(wait_driver, timeout=180):
 
 
 def extract(sheet):
+    # A source for ShardLinks; nothing is read until a shard asks for its rows.
+    if os.environ.get("LINK_QUEUE"):
+        # Streaming: rows arrive while the link stage is still running.
+        queue = LinkQueue(os.environ["LINK_QUEUE"])
+        return FileLinkSource(queue.path, queue.is_closed, queue.is_aborted)
+    cache_path = os.environ.get("LINK_LIST_CACHE")
+    if cache_path and os.path.exists(cache_path):
+        return FileLinkSource(cache_path)
+
     retries = 10
     delay = 60
     for attempt in range(retries):
         try:
-            sheet_header = sheet.row_values(1)
+            sheet_header = web_sheet.get_header(sheet)
             break
         except Exception:
             print(
@@ -71,96 +72,18 @@ def extract(sheet):
         raise Exception("Failed to fetch worksheet header after multiple attempts.")
 
     try:
-        link_idx = sheet_header.index("Link") + 1
-        postcode_idx = sheet_header.index("postcode") + 1
+        schema = get_schema("PractitionerLink", sheet_header)
     except ValueError as e:
         print("Could not detect requested row", e)
-        return []
-
-    for attempt in range(retries):
-        try:
-            all_rows = sheet.get_all_values()[1:]
-            break
-        except Exception:
-            print(
-                f"Read quota error when fetching all values. Retrying in {delay} seconds... (Attempt {attempt + 1}/{retries})")
-            time.sleep(delay)
-            delay *= 2
-    else:
-        raise Exception("Failed to fetch all values after 3 attempts.")
-    link_list = []
-    for row_num, row in enumerate(all_rows, start=2):
-        link = row[link_idx - 1] if len(row) >= link_idx else ""
-        postcode = row[postcode_idx - 1] if len(row) >= postcode_idx else ""
-        if not link:
-            break
-        mixed = {link: postcode}
-        link_list.append(mixed)
-    return link_list
-
-def load_to_seen_data():
-    retries = 10
-    delay = 60
-
-    for attempt in range(retries):
-        try:
-            detail_sheet = web_sheet.get_worksheet("PractitionerDetail")
-            break
-        except Exception:
-            print(
-                f"load_to_seen_data: Error in get_worksheet. Retry after {delay} seconds... ({attempt + 1}/{retries})")
-            time.sleep(delay)
-            delay *= 2
-    else:
-        raise Exception("load_to_seen_data: Failed to get PracticeDetail sheet after multiple attempts.")
-
-    delay = 60
-    for attempt in range(retries):
-        try:
-            detail_header = detail_sheet.row_values(1)
-            break
-        except Exception:
-            print(
-                f"load_to_seen_data: Error 429 in header read. Retry after {delay} seconds... ({attempt + 1}/{retries})")
-            time.sleep(delay)
-            delay *= 2
-    else:
-        raise Exception("load_to_seen_data: Failed to retrieve worksheet header after multiple attempts.")
-
-    try:
-        detail_name_idx = detail_header.index("Name") + 1
-        detail_address_idx = detail_header.index("Business address") + 1
-    except ValueError as e:
-        print("load_to_seen_data: Requested header row not found.", e)
-        return
-
-    delay = 60
-    for attempt in range(retries):
-        try:
-            all_rows = detail_sheet.get_all_values()[1:]
-            break
-        except Exception:
-            print(
-                f"load_to_seen_data: 429 error in full row read. Retry after {delay} seconds... ({attempt + 1}/{retries})")
-            time.sleep(delay)
-            delay *= 2
-    else:
-        raise Exception("load_to_seen_data: Failed to retrieve entire row after multiple attempts.")
+        return ListLinkSource([])
+    return SheetLinkSource(sheet, schema)
 
-    dup_list = []
-    for row_num, row in enumerate(all_rows, start=2):
-        detail_name = row[detail_name_idx - 1] if len(row) >= detail_name_idx else ""
-        detail_address = row[detail_address_idx - 1] if len(row) >= detail_address_idx else ""
-        detail = {detail_name: detail_address}
-        dup_list.append(detail)
-    return dup_list
 
-
-def find_element(element_driver, tag):
+def find_element(element_driver, tag, timeout=10):
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            element = WebDriverWait(element_driver, 10).until(
+            element = WebDriverWait(element_driver, timeout).until(
                 EC.presence_of_element_located((By.XPATH, tag))
             )
             return element
@@ -173,11 +96,11 @@ def find_element(element_driver, tag):
                 return "N/A"
 
 
-def find_elements(element_driver, tag):
+def find_elements(element_driver, tag, timeout=10):
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            elements = WebDriverWait(element_driver, 10).until(
+            elements = WebDriverWait(element_driver, timeout).until(
                 EC.presence_of_all_elements_located((By.XPATH, tag))
             )
             return elements
@@ -190,87 +113,191 @@ def find_elements(element_driver, tag):
                 return "N/A"
 
 
-def update_category(name, address, new_category):
-    retries = 10
-    delay = 60
-
-    for attempt in range(retries):
-        try:
-            detail_sheet = web_sheet.get_worksheet("PractitionerDetail")
-            break
-        except Exception as e:
-            print(
-                f"update_category: APIError in row_values: {e}. Retry after {delay} seconds... ({attempt + 1}/{retries})")
-            time.sleep(delay)
-    else:
-        print("update_category: Failed to get the Practice Detail sheet after multiple attempts.")
-        return
-
-    for attempt in range(retries):
-        try:
-            header = detail_sheet.row_values(1)
-            break
-        except Exception as e:
-            print(
-                f"update_category: APIError in row_values: {e}. Retry after {delay} seconds... ({attempt + 1}/{retries})")
-            time.sleep(delay)
-    else:
-        print("update_category: Failed to retrieve header after multiple attempts.")
-        return
-
+def geocode(address):
+    # Keyed by the canonical address, so spelling variants of one address share a lookup.
+    key = address_key(address)
+    known = geocodes.fresh(key)
+    if known:
+        return known[0], known[1]
+    if centroids.low_precision:
+        return centroids.fallback(address)
+    maps_url = f"https://www.google.com/maps/search/?api=1&query={quote(address)}"
+    driver.get(maps_url)
     try:
-        name_idx = header.index("Name") + 1
-        address_idx = header.index("Business address") + 1
-        category_idx = header.index("Category") + 1
-    except ValueError as e:
-        print("No required header:", e)
-        return
-
-    for attempt in range(retries):
-        try:
-            all_rows = detail_sheet.get_all_values()[1:]
-            break
-        except Exception as e:
-            print(
-                f"update_category: APIError in update_cell: {e}. Retry after {delay} seconds... ({attempt + 1}/{retries})")
-            time.sleep(delay)
+        WebDriverWait(driver, 30).until(lambda d: "@" in d.current_url)
+    except TimeoutException:
+        print("lat/long not in url.")
+        return centroids.fallback(address)
+    map_url = driver.current_url
+    pattern = r"@(-?\d+\.\d+),(-?\d+\.\d+)"
+    match = re.search(pattern, map_url)
+    if not match:
+        return centroids.fallback(address)
+    geocodes.put(key, list(match.groups()))
+    return match.groups()
+
+
+def read_detail_dom(timeout=10):
+    wait_for_page_load(driver)
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    wait_for_page_load(driver)
+    name = find_element(driver,
+                        ".//lightning-layout-item[contains(@class, 'summary-view-responsive-style practitioner-name-style')]",
+                        timeout)
+    if name != "N/A":
+        name = name.text
+    category = find_element(driver, "//c-practitioner-detail//p[@class='sub-header-text-style']", timeout)
+    if category != "N/A":
+        category = category.text
+    details = find_elements(driver,
+                            ".//lightning-layout-item[contains(@class, 'detail-value-responsive-style')]", timeout)
+    if details == "N/A":
+        return None
+    fields = [
+        ("address", True),
+        ("contact", False),
+        ("limitations", True),
+        ("conditions", True),
+        ("status", False),
+        ("registration_number", False),
+        ("commenced", False),
+        ("anniversary", False),
+        ("expires", False),
+        ("date_scs", False),
+        ("reason_scs", True),
+        ("director_name", True),
+    ]
+
+    data = {}
+    for i, (field, replace_newline) in enumerate(fields):
+        if i < len(details):
+            text = details[i].text
+            data[field] = text.replace("\n", ", ") if replace_newline else text
+        else:
+            data[field] = "N/A"
+
+    address = data["address"]
+    contact = data["contact"]
+    limitations = data["limitations"]
+    conditions = data["conditions"]
+    status = data["status"]
+    registration_number = data["registration_number"]
+    commenced = data["commenced"]
+    anniversary = data["anniversary"]
+    expires = data["expires"]
+    date_scs = data["date_scs"]
+    reason_scs = data["reason_scs"]
+    director_name = data["director_name"]
+
+    partnership_element = find_element(driver,
+                                       "//p[contains(@class, 'sub-header-text-style') and contains(text(), 'Partnership details')]/following-sibling::div//span",
+                                       timeout)
+    partnership = partnership_element.text if partnership_element != "N/A" else ""
+    return [name, category, address, contact, limitations, conditions, status, registration_number,
+            commenced, anniversary, expires, date_scs, reason_scs, director_name, partnership]
+
+
+def scrape_detail(current_link, timeout=10):
+    capture.reset()
+    driver.get(current_link)
+    # With AURA_CAPTURE=1 the record comes straight from the Apex response; the DOM is the fallback.
+    detail_values = capture.wait_for(detail_from_actions, timeout)
+    if detail_values is None:
+        detail_values = read_detail_dom(timeout)
+    if detail_values is None:
+        return None, "Failed to find details"
+    address = detail_values[2]
+    content_hash = digest(detail_values)
+    cached = page_cache.get(current_link)
+    if cached and cached["hash"] == content_hash and cached["payload"][15] != "No lat given":
+        # Same record as last cycle: reuse its coordinates instead of another Maps lookup.
+        va_lat, va_long = cached["payload"][15], cached["payload"][16]
+    elif address and address != "VAC":
+        va_lat, va_long = geocode(address)
     else:
-        print("update_category: update_cell failed after multiple attempts.")
+        va_lat = "No lat given"
+        va_long = "No long given"
+
+    row = detail_values + [va_lat, va_long]
+    # The page was loaded because it was new or failed revalidation, so its old validators are stale too.
+    etag, last_modified, probe = page_cache.validators(current_link, current_link)
+    page_cache.put(current_link, row, content_hash, etag, last_modified, probe)
+    return row, None
+
+
+def scrape_rows(ph, progress, link_source, detail_sheet, scheduler):
+    link_list = ShardLinks(link_source, progress["RowNum"])
+    links_done = CompletionBitmap.from_dict(progress.get("links"), len(link_list))
+    since_save = 0
+    # "end" is set when another shard has split off the back of this range.
+    while (scheduler.has_budget() and (progress.get("end") is None or progress["RowNum"] < progress["end"])
+           and link_list.wait_for(progress["RowNum"], scheduler.remaining() - scheduler.margin)):
+        links_done.grow(len(link_list))
+        scheduler.begin_item()
+        current_link_dict = link_list[progress["RowNum"]]
+        current_link = list(current_link_dict.keys())[0]
+        postcode = list(current_link_dict.values())[0]
+        print(f"current page: row {progress['RowNum']}")
+        if not current_link.startswith("http"):
+            row, reason = None, "Link was not captured by the link scraper"
+        elif page_cache.fresh(current_link, current_link):
+            row, reason = page_cache.get(current_link)["payload"], None
+            print("Details unchanged since the last check.")
+        else:
+            try:
+                row, reason = scrape_detail(current_link)
+            except WebDriverException as e:
+                row, reason = None, f"Browser error: {e.msg}"
+
+        if row is None:
+            links_done.mark_failed(progress["RowNum"])
+            dead_letters.record(progress["RowNum"], current_link, postcode, reason,
+                                time.time() - scheduler.item_start, ph.position)
+            print(f"Current row: {progress["RowNum"]}, {reason}. Processing to next row.")
+        else:
+            detail_writer.write(row + [postcode], current_link)
+            links_done.mark_done(progress["RowNum"])
+        progress["RowNum"] += 20
+        scheduler.end_item()
+        since_save += 1
+        if since_save >= detail_writer.flush_every:
+            # Rows reach the sheet before the cursor moves past them.
+            detail_writer.flush()
+            progress["links"] = links_done.to_dict()
+            progress.update(scheduler.stats())
+            since_save = 0
+            if not ph.save_progress(progress):
+                break
+
+    if ph.lost:
+        detail_writer.flush()
+        page_cache.save()
+        geocodes.save()
         return
+    if link_list.complete(len(link_list)):
+        progress["total"] = len(link_list)
+    ended = progress.get("end") is not None and progress["RowNum"] >= progress["end"]
+    if ended or link_list.complete(progress["RowNum"]):
+        progress["progress"] = "finished"
+    else:
+        progress["progress"] = "handoff"
+        rows_left = remaining_rows(progress, progress.get("end") or len(link_list))
+        print(f"Time budget nearly spent. Handing off {rows_left} rows (~{int(scheduler.estimate(rows_left))} seconds).")
+    detail_writer.flush()
+    progress["links"] = links_done.to_dict()
+    progress.update(scheduler.stats())
+    progress.pop("owner", None)
+    page_cache.save()
+    geocodes.save()
+    ph.save_progress(progress)
 
-    for row_num, row in enumerate(all_rows, start=2):
-        row_name = row[name_idx - 1] if len(row) >= name_idx else ""
-        row_address = row[address_idx - 1] if len(row) >= address_idx else ""
-        if row_name == name and row_address == address:
-            current_category = row[category_idx - 1] if len(row) >= category_idx else ""
-            categories = [cat.strip() for cat in current_category.split(",") if cat.strip()] if current_category else []
-            if new_category in categories:
-                print("Category exists.")
-                return
-            categories.append(new_category)
-            updated_category = ", ".join(categories)
-
-            for attempt in range(retries):
-                try:
-                    detail_sheet.update_cell(row_num, category_idx, updated_category)
-                    print(f"Row {row_num}'s category has been updated to '{updated_category}'.")
-                    return
-                except Exception as e:
-                    print(
-                        f"update_category: APIError in update_cell: {e}. Retry after {delay} seconds... ({attempt + 1}/{retries})")
-                    time.sleep(delay)
-            else:
-                print("update_category: update_cell failed after multiple attempts.")
-                return
-
-    print("Could not find matching name and address.")
-
-
-def timer(start, end):
-    return (end - start) < 14400
 
 def main():
+    if is_finished(web_sheet, "C2", DETAIL_POSITIONS):
+        print("Finished already")
+        return
     start = time.time()
+    scheduler = BudgetScheduler(start=start)
     retries = 10
     delay = 60
     for attempt in range(retries):
@@ -308,133 +335,32 @@ def main():
             delay *= 2
     else:
         raise Exception("load_to_seen_data: Failed to get the Progress sheet after multiple attempts.")
-    ph = ProcessHandler(progress_sheet, {"progress": "setting", "RowNum": 2}, "C2")
-    progress = ph.load_progress()
-    link_list = extract(link_sheet)
+    ph = ProcessHandler(progress_sheet, {"progress": "setting", "RowNum": 2}, "C2", shutdown_callback=detail_writer.flush)
+    progress = ph.progress
+    ensure_detail_sheet(web_sheet, detail_sheet)
+    link_source = extract(link_sheet)
     if progress["progress"] != "finished":
         detail_sheet.update([["Running Scrapping"]], "S1")
-        while progress["RowNum"] < len(link_list) and timer(start, time.time()):
+        if progress.get("owner") not in (None, ph.position):
+            print(f"Rows are being handled by {progress['owner']}.")
+        else:
             progress["progress"] = "processing"
-            current_link_dict = link_list[progress["RowNum"]]
-            seen_data = load_to_seen_data()
-            current_link = list(current_link_dict.keys())[0]
-            driver.get(current_link)
-            wait_for_page_load(driver)
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            wait_for_page_load(driver)
-            print(f"current page: row {progress['RowNum']}")
-            name = find_element(driver,
-                                ".//lightning-layout-item[contains(@class, 'summary-view-responsive-style practitioner-name-style')]")
-            if name != "N/A":
-                name = name.text
-            category = find_element(driver, "//c-practitioner-detail//p[@class='sub-header-text-style']")
-            if category != "N/A":
-                category = category.text
-            details = find_elements(driver,
-                                    ".//lightning-layout-item[contains(@class, 'detail-value-responsive-style')]")
-            if details == "N/A":
-                progress["RowNum"] += 1
-                print(f"Current row: {progress["RowNum"]}, Failed to find details. Processing to next row.")
-                continue
-            fields = [
-                ("address", True),
-                ("contact", False),
-                ("limitations", True),
-                ("conditions", True),
-                ("status", False),
-                ("registration_number", False),
-                ("commenced", False),
-                ("anniversary", False),
-                ("expires", False),
-                ("date_scs", False),
-                ("reason_scs", True),
-                ("director_name", True),
-            ]
-
-            data = {}
-            for i, (field, replace_newline) in enumerate(fields):
-                if i < len(details):
-                    text = details[i].text
-                    data[field] = text.replace("\n", ", ") if replace_newline else text
-                else:
-                    data[field] = "N/A"
-
-            address = data["address"]
-            contact = data["contact"]
-            limitations = data["limitations"]
-            conditions = data["conditions"]
-            status = data["status"]
-            registration_number = data["registration_number"]
-            commenced = data["commenced"]
-            anniversary = data["anniversary"]
-            expires = data["expires"]
-            date_scs = data["date_scs"]
-            reason_scs = data["reason_scs"]
-            director_name = data["director_name"]
-
-            partnership_element = find_element(driver,
-                                               "//p[contains(@class, 'sub-header-text-style') and contains(text(), 'Partnership details')]/following-sibling::div//span")
-            partnership = partnership_element.text if partnership_element != "N/A" else ""
-            if address and address != "VAC":
-                maps_url = f"https://www.google.com/maps/search/?api=1&query={quote(address)}"
-                driver.get(maps_url)
-                try:
-                    WebDriverWait(driver, 30).until(lambda d: "@" in d.current_url)
-                except TimeoutException:
-                    print("lat/long not in url.")
-                    va_lat, va_long = "No lat given", "No long given"
-                else:
-                    map_url = driver.current_url
-                    pattern = r"@(-?\d+\.\d+),(-?\d+\.\d+)"
-                    match = re.search(pattern, map_url)
-                    if match:
-                        va_lat, va_long = match.groups()
-                    else:
-                        va_lat = "No lat given"
-                        va_long = "No long given"
-            else:
-                va_lat = "No lat given"
-                va_long = "No long given"
-
-            update = any(seen.get(name) == address for seen in seen_data)
-
-            current_dict = link_list[progress["RowNum"]]
-            postcode = list(current_dict.values())[0]
-
-            if not update:
-                updates = [name,
-                           category,
-                           address,
-                           contact,
-                           limitations,
-                           conditions,
-                           status,
-                           registration_number,
-                           commenced,
-                           anniversary,
-                           expires,
-                           date_scs,
-                           reason_scs,
-                           director_name,
-                           partnership,
-                           va_lat,
-                           va_long,
-                           postcode
-                           ]
-                append_row_with_retry(detail_sheet, updates)
-            else:
-                update_category(name, address, category)
-            progress["RowNum"] += 20
-            ph.save_progress(progress)
-
-        if not progress["RowNum"] < len(link_list):
-            progress["progress"] = "finished"
-        ph.save_progress(progress)
-        driver.quit()
-        print("Saved every data into the Google Sheet successfully.")
+            if ph.save_progress(progress):
+                scrape_rows(ph, progress, link_source, detail_sheet, scheduler)
     else:
         print("Finished already")
 
+    while scheduler.has_budget():
+        # Handed-off ranges first, then the back half of the busiest range still running.
+        other = claim_handoff(progress_sheet, ph.position, detail_writer.flush)
+        if other is None and steal_tail(ph, detail_writer.flush_every):
+            other = ph
+        if other is None:
+            break
+        scrape_rows(other, other.progress, link_source, detail_sheet, scheduler)
+    driver.quit()
+    print("Saved every data into the Google Sheet successfully.")
+
 
 if __name__ == "__main__":
     main()
@@ -1,38 +1,23 @@
 # practitioner_link_05.py
 import time
-import csv
-import gspread
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+from crawl_plan import get_plan
 from google_form_package import Sheet
-from process_handler import ProcessHandler
+from link_staging import LinkStaging
+from process_handler import ProcessHandler, is_finished
+from progress_bitmap import CompletionBitmap
+from search_paging import select_largest_page_size
 
 web_sheet = Sheet()
-driver = web_sheet.set_driver()
+driver = web_sheet.lazy_driver()
 wait = WebDriverWait(driver, 10)
 URL = "https://bams.vba.vic.gov.au/bams/s/practitioner-search"
 
 
-def set_postcode():
-    f = open('refined_db.csv', 'r', encoding='utf-8')
-    rdr = csv.reader(f)
-    postcode = []
-    for line in rdr:
-        postcode.append(line)
-    f.close()
-    return postcode
-
-
-def set_link_sheet(worksheet):
-    worksheet.clear()
-    headers = ["postcode", "Name", "Link"]
-    worksheet.append_row(headers)
-    return worksheet
-
-
 def wait_for_page_load(base_driver, timeout=15):
     try:
         WebDriverWait(base_driver, timeout).until(
@@ -44,21 +29,6 @@ def wait_for_page_load(base_driver, timeout=15):
         print(f"An error occurred while waiting for page load: {e}")
 
 
-def batch_append_multiple_rows(worksheet, rows_list, retries=10, delay=60):
-    for attempt in range(retries):
-        try:
-            worksheet.append_rows(rows_list, value_input_option='USER_ENTERED')
-            return
-        except gspread.exceptions.APIError as e:
-            if any(code in str(e) for code in ["429", "500", "502", "503", "504"]):
-                print(f"API Error ({e}). Retry after {delay} seconds... (attempt {attempt + 1}/{retries})")
-                time.sleep(delay)
-                delay *= 2
-            else:
-                raise
-    print("Failed to append multiple rows.")
-
-
 def find_element(element_driver, tag):
     max_retries = 1
     for attempt in range(max_retries):
@@ -94,29 +64,42 @@ def find_elements(element_driver, tag):
 
 
 def main():
+    if is_finished(web_sheet, "E1"):
+        print("Finished already")
+        return
     link_sheet = web_sheet.get_worksheet("PractitionerLink")
     progress_sheet = web_sheet.get_worksheet("Progress")
-    postcode_list = set_postcode()
+    # Rows go to this shard's own staging area; link_staging.py merges them into PractitionerLink.
+    staging = LinkStaging(web_sheet, "05")
+    # CRAWL_PLAN picks the search facet; the default walks the postcodes in refined_db.csv.
+    plan = get_plan()
+    postcode_list = plan.queries()
     ph = ProcessHandler(progress_sheet, {"progress": "setting", "UrlNum": 4}, "E1")
-    progress = ph.load_progress()
+    progress = ph.progress
     if progress["progress"] == "setting":
-        set_link_sheet(link_sheet)
+        staging.reset()
     link_sheet.update([["Running Scrapping"]], "D1")
     if progress["progress"] != "finished":
         progress["progress"] = "processing"
+        postcodes_done = CompletionBitmap.from_dict(progress.get("postcodes"), len(postcode_list))
         append_list = []
         while progress["UrlNum"] < len(postcode_list):
             postcode = postcode_list[progress["UrlNum"]]
+            search_start = time.time()
             driver.get(URL)
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
             wait_for_page_load(driver)
             postcode_input = wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//input[@name='postcode']"))
+                EC.element_to_be_clickable((By.XPATH, plan.input_xpath))
             )
             postcode_input.clear()
-            postcode_input.send_keys(postcode[0])
+            postcode_input.send_keys(postcode)
             search_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[text()='Search']")))
             search_button.click()
+            # Fewer, larger pages: every page costs a click, a load wait and a full re-scrape.
+            page_size = select_largest_page_size(driver)
+            if page_size:
+                wait_for_page_load(driver)
             page_buttons = find_elements(driver, ".//button[contains(@kx-type, 'underline')]")
             page_numbers = []
             links = []
@@ -126,7 +109,7 @@ def main():
                 for page_button in page_buttons:
                     page_numbers.append(page_button.text)
 
-            print(f"Starting {postcode[0]}")
+            print(f"Starting {postcode}")
             pagenum = 1
             post_list = []
             while str(pagenum) in page_numbers:
@@ -150,7 +133,7 @@ def main():
                             else:
                                 name = "Failed to load practitioner"
                                 link = "Failed to load practitioner link"
-                            links.append([postcode[0], name, link])
+                            links.append([postcode, name, link])
 
                         post_list.append(links)
                         links = []
@@ -173,17 +156,24 @@ def main():
                             else:
                                 name = "Failed to load practitioner"
                                 link = "Failed to load practitioner link"
-                            links.append([postcode[0], name, link])
+                            links.append([postcode, name, link])
 
                         post_list.append(links)
                         break
                     else:
                         break
             append_list.append(post_list)
+            staging.publish([row for page in post_list for row in page])
+            progress.setdefault("pages", {})[postcode] = len(post_list)
+            print(f"[metrics] postcode={postcode} pages={len(post_list)} "
+                  f"results={sum(len(page) for page in post_list)} page_size={page_size or 'default'} "
+                  f"seconds={time.time() - search_start:.1f}")
+            postcodes_done.mark_done(progress["UrlNum"])
 
             if len(append_list) >= 20:
                 update = [row for post in append_list for page in post for row in page]
-                batch_append_multiple_rows(link_sheet, update)
+                staging.append(update)
+                progress["postcodes"] = postcodes_done.to_dict()
                 ph.save_progress(progress)
                 append_list = []
             progress["UrlNum"] += 20
@@ -191,9 +181,10 @@ def main():
 
         if append_list:
             update = [row for post in append_list for page in post for row in page]
-            batch_append_multiple_rows(link_sheet, update)
+            staging.append(update)
 
         progress["progress"] = "finished"
+        progress["postcodes"] = postcodes_done.to_dict()
         ph.save_progress(progress)
 
         link_sheet.update([["Finished Scrapping"]], "D1")
@@ -0,0 +1,216 @@
+# practitioner_store.py
+import difflib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from address_parser import parse_address
+from detail_writer import FIELD_COUNT, TOMBSTONE, DetailWriter
+from google_form_package import Sheet
+from sheet_reader import read_columns
+from sheet_schema import get_schema
+
+INDEX_DIR = "index"
+DB_PATH = os.path.join(INDEX_DIR, "practitioners.db")
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# bm25 weights for name, category, address, director.
+RANK = "bm25(practitioner_fts, 10.0, 2.0, 4.0, 3.0)"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS practitioners (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    row INTEGER,
+    name TEXT, category TEXT, address TEXT, director TEXT,
+    status TEXT, registration TEXT, postcode TEXT, suburb TEXT,
+    lat REAL, long REAL, link TEXT, hash TEXT, data TEXT, updated REAL
+);
+CREATE INDEX IF NOT EXISTS practitioners_registration ON practitioners (registration);
+CREATE INDEX IF NOT EXISTS practitioners_postcode ON practitioners (postcode);
+CREATE INDEX IF NOT EXISTS practitioners_suburb ON practitioners (suburb);
+CREATE INDEX IF NOT EXISTS practitioners_row ON practitioners (row);
+CREATE VIRTUAL TABLE IF NOT EXISTS practitioner_fts USING fts5(
+    name, category, address, director,
+    content='practitioners', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS practitioner_terms USING fts5vocab(practitioner_fts, 'row');
+CREATE TRIGGER IF NOT EXISTS practitioners_ai AFTER INSERT ON practitioners BEGIN
+    INSERT INTO practitioner_fts (rowid, name, category, address, director)
+    VALUES (new.id, new.name, new.category, new.address, new.director);
+END;
+CREATE TRIGGER IF NOT EXISTS practitioners_ad AFTER DELETE ON practitioners BEGIN
+    INSERT INTO practitioner_fts (practitioner_fts, rowid, name, category, address, director)
+    VALUES ('delete', old.id, old.name, old.category, old.address, old.director);
+END;
+CREATE TRIGGER IF NOT EXISTS practitioners_au AFTER UPDATE ON practitioners BEGIN
+    INSERT INTO practitioner_fts (practitioner_fts, rowid, name, category, address, director)
+    VALUES ('delete', old.id, old.name, old.category, old.address, old.director);
+    INSERT INTO practitioner_fts (rowid, name, category, address, director)
+    VALUES (new.id, new.name, new.category, new.address, new.director);
+END;
+"""
+COLUMNS = ["key", "row", "name", "category", "address", "director", "status", "registration", "postcode", "suburb",
+           "lat", "long", "link", "hash", "data", "updated"]
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def record(key, row, link, content_hash=None, row_num=None):
+    # row is the PractitionerDetail layout: 17 scraped fields plus the search postcode.
+    parsed = parse_address(row[2])
+    return {
+        "key": key, "row": row_num, "name": row[0], "category": row[1], "address": row[2], "director": row[13],
+        "status": row[6], "registration": row[7], "postcode": parsed["postcode"] or row[17], "suburb": parsed["suburb"],
+        "lat": to_float(row[15]), "long": to_float(row[16]), "link": link, "hash": content_hash,
+        "data": json.dumps(list(row), ensure_ascii=False), "updated": time.time(),
+    }
+
+
+class PractitionerStore:
+    def __init__(self, path=DB_PATH, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            if self.readonly:
+                self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                # Shard workers on one host share the file; WAL lets readers run beside the writer.
+                self._connection = sqlite3.connect(self.path, timeout=60)
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.executescript(SCHEMA)
+            self._connection.row_factory = sqlite3.Row
+        return self._connection
+
+    def upsert(self, records):
+        if not records:
+            return 0
+        placeholders = ", ".join(f":{column}" for column in COLUMNS)
+        updates = ", ".join(f"{column} = coalesce(excluded.{column}, {column})" if column == "row"
+                            else f"{column} = excluded.{column}" for column in COLUMNS[1:])
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO practitioners ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(key) DO UPDATE SET {updates}", records)
+        return len(records)
+
+    def replace_all(self, records):
+        with self.connection:
+            self.connection.execute("DELETE FROM practitioners")
+        self.upsert(records)
+        with self.connection:
+            self.connection.execute("INSERT INTO practitioner_fts (practitioner_fts) VALUES ('optimize')")
+
+    def count(self):
+        return self.connection.execute("SELECT count(*) FROM practitioners").fetchone()[0]
+
+    def close_terms(self, token, limit=3):
+        # Fuzzy matching: expand a token to indexed terms that share its first letter and look alike.
+        candidates = [row[0] for row in self.connection.execute(
+            "SELECT term FROM practitioner_terms WHERE term >= ? AND term < ?", (token[0], chr(ord(token[0]) + 1)))]
+        return difflib.get_close_matches(token, candidates, n=limit, cutoff=0.75)
+
+    def match_expression(self, text, fuzzy=False):
+        terms = []
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            options = [f'"{token}"*']
+            if fuzzy:
+                options += [f'"{term}"' for term in self.close_terms(token) if term != token]
+            terms.append(options[0] if len(options) == 1 else f"({' OR '.join(options)})")
+        return " AND ".join(terms)
+
+    def search(self, text="", category=None, status=None, postcode=None, suburb=None, limit=20, offset=0,
+               fuzzy=False):
+        clauses, params = [], []
+        expression = self.match_expression(text, fuzzy) if text else ""
+        if text and not expression:
+            # Only punctuation: nothing can match, and an unfiltered listing would be misleading.
+            return []
+        if expression:
+            source = "practitioner_fts JOIN practitioners p ON p.id = practitioner_fts.rowid"
+            clauses.append("practitioner_fts MATCH ?")
+            params.append(expression)
+            order = RANK
+        else:
+            source = "practitioners p"
+            order = "p.name"
+        if category:
+            clauses.append("p.category LIKE ?")
+            params.append(f"%{category}%")
+        for column, value in [("status", status), ("postcode", postcode), ("suburb", suburb)]:
+            if value:
+                clauses.append(f"p.{column} = ? COLLATE NOCASE")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.connection.execute(
+            f"SELECT p.* FROM {source} {where} ORDER BY {order} LIMIT ? OFFSET ?", params + [limit, offset])
+        results = [dict(row) for row in rows]
+        if fuzzy or results or not expression:
+            return results
+        # Nothing matched exactly: retry once with close spellings of each word.
+        return self.search(text, category, status, postcode, suburb, limit, offset, fuzzy=True)
+
+    def by_registration(self, registration):
+        rows = self.connection.execute("SELECT * FROM practitioners WHERE registration = ?", (registration,))
+        return [dict(row) for row in rows]
+
+    def by_rows(self, row_nums):
+        row_nums = list(row_nums)
+        found = {}
+        for start in range(0, len(row_nums), 500):
+            chunk = row_nums[start:start + 500]
+            query = f"SELECT * FROM practitioners WHERE row IN ({', '.join('?' * len(chunk))})"
+            for row in self.connection.execute(query, chunk):
+                found[row["row"]] = dict(row)
+        return [found[row_num] for row_num in row_nums if row_num in found]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def build(web_sheet, path=DB_PATH):
+    detail_sheet = web_sheet.get_worksheet("PractitionerDetail")
+    schema = get_schema("PractitionerDetail", web_sheet.get_header(detail_sheet))
+    columns = [column for column in schema.columns if column]
+    records = []
+    for row_num, values in enumerate(read_columns(detail_sheet, schema, columns), start=2):
+        row = dict(zip(columns, values))
+        if not row["Name"] or row["Row hash"] == TOMBSTONE:
+            continue
+        fields = values[:FIELD_COUNT]
+        records.append(record(DetailWriter.key(row["Name"], row["Business address"]), fields, row["Link"],
+                              row["Row hash"], row_num))
+    store = PractitionerStore(path)
+    store.replace_all(records)
+    print(f"Indexed {len(records)} practitioners into {path}.")
+    return store
+
+
+def main():
+    if len(sys.argv) > 1:
+        store = PractitionerStore(readonly=True)
+        start = time.perf_counter()
+        results = store.search(" ".join(sys.argv[1:]))
+        print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for result in results:
+            print(f"{result['name']} | {result['category']} | {result['address']} | {result['registration']}")
+        return
+    build(Sheet())
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,76 @@ import json
 import signal
 import sys
 import time
+import uuid
+
+from gspread.utils import a1_to_rowcol
+
+
+def is_finished(web_sheet, position, helper_positions=None):
+    # One plain values read, so shards with nothing to do exit before opening the spreadsheet or Chrome.
+    positions = [position] + list(helper_positions or [])
+    cols = {p: a1_to_rowcol(p)[1] for p in positions}
+    first = min(positions, key=cols.get)
+    last = max(positions, key=cols.get)
+    try:
+        values = web_sheet.peek(f"Progress!{first}:{last}")
+    except Exception as e:
+        print(f"Pre-flight progress check failed: {e}")
+        return False
+    row = values[0] if values else []
+    states = {}
+    for p in positions:
+        idx = cols[p] - cols[first]
+        try:
+            states[p] = json.loads(row[idx]).get("progress") if idx < len(row) and row[idx] else None
+        except ValueError:
+            states[p] = None
+    if states[position] != "finished":
+        return False
+    # Running shards may still have a tail worth splitting off, so only an all-finished row exits early.
+    return not any(states[p] in ("handoff", "processing") for p in positions[1:])
+
+
+def read_cell(progress_sheet, position):
+    value = progress_sheet.acell(position).value
+    return json.loads(value) if value else None
+
+
+def write_if(progress_sheet, position, change):
+    # change() sees the cell as it is now and returns the value to write, or None to leave it alone. The
+    # read and the write are separate calls, so this is not atomic: two writers can both pass the check.
+    updated = change(read_cell(progress_sheet, position))
+    if updated is not None:
+        progress_sheet.update(position, [[json.dumps(updated)]])
+    return updated
+
+
+def write_confirmed(progress_sheet, position, change, settle=5):
+    # For contested writes: stamp a token of our own, let any competing write land, and read it back. Of
+    # writers that raced, only the last one still finds its token, so at most one goes ahead.
+    token = uuid.uuid4().hex
+
+    def stamped(current):
+        updated = change(current)
+        if updated is not None:
+            updated["claim"] = token
+        return updated
+
+    updated = write_if(progress_sheet, position, stamped)
+    if updated is None:
+        return None
+    time.sleep(settle)
+    current = read_cell(progress_sheet, position)
+    return updated if current and current.get("claim") == token else None
+
 
 class ProcessHandler:
-    def __init__(self, progress_sheet, init_value, position, shutdown_callback=None):
+    def __init__(self, progress_sheet, init_value, position, shutdown_callback=None, owner=None):
         self.progress_sheet = progress_sheet
         self.position = position
+        # The shard running this cell: its own position, or the helper that claimed or split it.
+        self.owner = owner or position
+        self.lost = False
         self.init_value = init_value
         self.shutdown_callback = shutdown_callback
         self.progress = self.load_progress()
@@ -32,22 +97,70 @@ class ProcessHandler:
         print("Failed to load progress after multiple attempts, finishing program")
         return {"progress": "finished"}
 
+    def owns(self, current):
+        return not current or current.get("owner") in (None, self.owner)
+
     def save_progress(self, progress):
+        # False when another shard has taken the cell over; its value is then left as it is.
+        def change(current):
+            if not self.owns(current):
+                return None
+            # A helper may have split off our tail since the last save; keep the shorter range.
+            if current and current.get("end") is not None and (
+                    progress.get("end") is None or current["end"] < progress["end"]):
+                progress["end"] = current["end"]
+            # Keep a helper's token, so a split confirming itself is not undone by this save.
+            if current and current.get("claim"):
+                progress["claim"] = current["claim"]
+            if progress.get("progress") == "processing":
+                progress["owner"] = self.owner
+            progress["ts"] = int(time.time())
+            return progress
+
         retries = 10
         delay = 60
         for attempt in range(retries):
             try:
-                self.progress_sheet.update(self.position, [[json.dumps(progress)]])
-                return
+                if write_if(self.progress_sheet, self.position, change) is None:
+                    print(f"{self.position} is now handled by another shard; progress not saved.")
+                    self.lost = True
+                    return False
+                return True
             except Exception as e:
                 print(f"Failed to save progress: {e}. Retrying in {delay} seconds... (Attempt {attempt + 1}/{retries})")
                 time.sleep(delay)
                 delay *= 2
         print("Failed to save progress after multiple attempts.")
+        return False
+
+    def claim(self, stale_after=900, settle=5):
+        # Take over a handed-off cell, or one whose helper stopped checking in; False if another helper won.
+        def change(current):
+            if not current or current.get("progress") not in ("handoff", "processing"):
+                return None
+            stale = time.time() - current.get("ts", 0) > stale_after
+            owner = current.get("owner")
+            if current["progress"] == "handoff" and owner and not stale:
+                return None
+            if current["progress"] == "processing" and (not owner or owner == self.position or not stale):
+                return None
+            current.update({"progress": "processing", "owner": self.owner, "ts": int(time.time())})
+            return current
+
+        try:
+            claimed = write_confirmed(self.progress_sheet, self.position, change, settle)
+        except Exception as e:
+            print(f"Failed to claim {self.position}: {e}")
+            return False
+        if claimed is None:
+            return False
+        self.progress = claimed
+        return True
 
     def signal_handler(self, signum, frame):
-        self.save_progress(self.progress)
         print(f"Signal {signum} occurred! Saving before shutdown...")
+        # Buffered rows go out first so the saved cursor never points past unwritten data.
         if self.shutdown_callback:
             self.shutdown_callback()
+        self.save_progress(self.progress)
         sys.exit(0)
@@ -0,0 +1,85 @@
+# progress_bitmap.py
+import base64
+import zlib
+
+
+def encode_bits(bits):
+    return base64.b64encode(zlib.compress(bytes(bits))).decode("ascii")
+
+
+def decode_bits(text, size):
+    bits = bytearray(zlib.decompress(base64.b64decode(text))) if text else bytearray()
+    length = (size + 7) // 8
+    if len(bits) < length:
+        bits.extend(bytes(length - len(bits)))
+    return bits[:length]
+
+
+def count_bits(bits):
+    return int.from_bytes(bits, "big").bit_count()
+
+
+class CompletionBitmap:
+    def __init__(self, size, done=None, failed=None):
+        self.size = size
+        self.done = decode_bits(done, size)
+        self.failed = decode_bits(failed, size)
+        self.done_count = count_bits(self.done)
+        self.failed_count = count_bits(self.failed)
+
+    @classmethod
+    def from_dict(cls, data, size):
+        # The lists only grow between runs, so an older smaller bitmap is padded with unfinished items.
+        data = data or {}
+        return cls(max(size, data.get("size", 0)), data.get("done"), data.get("failed"))
+
+    def to_dict(self):
+        return {"size": self.size, "done": encode_bits(self.done), "failed": encode_bits(self.failed)}
+
+    @staticmethod
+    def get_bit(bits, index):
+        return bits[index >> 3] >> (index & 7) & 1
+
+    def is_done(self, index):
+        return bool(self.get_bit(self.done, index))
+
+    def is_failed(self, index):
+        return bool(self.get_bit(self.failed, index))
+
+    def mark_done(self, index):
+        if not self.is_done(index):
+            self.done[index >> 3] |= 1 << (index & 7)
+            self.done_count += 1
+        if self.is_failed(index):
+            self.failed[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+            self.failed_count -= 1
+
+    def mark_failed(self, index):
+        if not self.is_done(index) and not self.is_failed(index):
+            self.failed[index >> 3] |= 1 << (index & 7)
+            self.failed_count += 1
+
+    def grow(self, size):
+        # Streamed link lists get longer while a shard works through them.
+        if size > self.size:
+            length = (size + 7) // 8
+            self.done.extend(bytes(length - len(self.done)))
+            self.failed.extend(bytes(length - len(self.failed)))
+            self.size = size
+        return self
+
+    def merge(self, other):
+        if other.size > self.size:
+            self.size = other.size
+            self.done.extend(bytes(len(other.done) - len(self.done)))
+            self.failed.extend(bytes(len(other.failed) - len(self.failed)))
+        for i in range(len(other.done)):
+            self.done[i] |= other.done[i]
+        for i in range(len(self.failed)):
+            self.failed[i] = (self.failed[i] | (other.failed[i] if i < len(other.failed) else 0)) & ~self.done[i] & 0xFF
+        self.done_count = count_bits(self.done)
+        self.failed_count = count_bits(self.failed)
+        return self
+
+    def completion(self):
+        return self.done_count / self.size if self.size else 1.0
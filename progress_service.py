@@ -0,0 +1,101 @@
+# progress_service.py
+import json
+import time
+
+from google_form_package import Sheet
+from progress_bitmap import CompletionBitmap
+
+LINK_POSITIONS = [f"{chr(ord('A') + i)}1" for i in range(20)]
+DETAIL_POSITIONS = [f"{chr(ord('A') + i)}2" for i in range(20)]
+GRID_RANGE = f"{LINK_POSITIONS[0]}:{DETAIL_POSITIONS[-1]}"
+
+
+def initial_grid():
+    link_row = [json.dumps({"progress": "setting", "UrlNum": i}) for i in range(len(LINK_POSITIONS))]
+    detail_row = [json.dumps({"progress": "setting", "RowNum": i}) for i in range(len(DETAIL_POSITIONS))]
+    return [link_row, detail_row]
+
+
+class ProgressService:
+    def __init__(self, progress_sheet, retries=5, delay=30):
+        self.progress_sheet = progress_sheet
+        self.retries = retries
+        self.delay = delay
+        self.grid = {}
+
+    def with_retry(self, action, label):
+        delay = self.delay
+        for attempt in range(self.retries):
+            try:
+                return action()
+            except Exception as e:
+                if attempt == self.retries - 1:
+                    break
+                print(f"Failed to {label}: {e}. Retrying in {delay} seconds... (Attempt {attempt + 1}/{self.retries})")
+                time.sleep(delay)
+                delay *= 2
+        raise Exception(f"Failed to {label} after multiple attempts.")
+
+    def load(self):
+        rows = self.with_retry(lambda: self.progress_sheet.get(GRID_RANGE), "load progress grid")
+        grid = {}
+        for positions, row in zip([LINK_POSITIONS, DETAIL_POSITIONS], list(rows) + [[], []]):
+            for i, position in enumerate(positions):
+                cell = row[i] if i < len(row) else ""
+                try:
+                    grid[position] = json.loads(cell) if cell else None
+                except ValueError:
+                    grid[position] = None
+        self.grid = grid
+        return grid
+
+    def reset(self):
+        grid = initial_grid()
+        self.with_retry(lambda: self.progress_sheet.update(values=grid, range_name=GRID_RANGE), "reset progress grid")
+        for positions, row in zip([LINK_POSITIONS, DETAIL_POSITIONS], grid):
+            self.grid.update({position: json.loads(cell) for position, cell in zip(positions, row)})
+
+    def summary(self):
+        if not self.grid:
+            self.load()
+        view = {}
+        for label, positions in [("link", LINK_POSITIONS), ("detail", DETAIL_POSITIONS)]:
+            states = {}
+            for position in positions:
+                progress = self.grid.get(position) or {}
+                state = progress.get("progress", "unknown")
+                states[state] = states.get(state, 0) + 1
+            view[label] = states
+        return view
+
+    def completion(self, key, positions):
+        # Shards keep their own bitmaps; OR-ing them gives the combined view.
+        if not self.grid:
+            self.load()
+        merged = None
+        for position in positions:
+            data = (self.grid.get(position) or {}).get(key)
+            if not data:
+                continue
+            bitmap = CompletionBitmap.from_dict(data, 0)
+            merged = bitmap if merged is None else merged.merge(bitmap)
+        return merged
+
+
+def main():
+    web_sheet = Sheet()
+    service = ProgressService(web_sheet.get_worksheet("Progress"))
+    service.load()
+    for label, states in service.summary().items():
+        print(f"{label}: " + ", ".join(f"{state}: {count}" for state, count in sorted(states.items())))
+    for label, key, positions in [("postcodes", "postcodes", LINK_POSITIONS), ("links", "links", DETAIL_POSITIONS)]:
+        bitmap = service.completion(key, positions)
+        if bitmap:
+            print(f"{label}: {bitmap.done_count}/{bitmap.size} done, {bitmap.failed_count} failed "
+                  f"({bitmap.completion():.1%})")
+    for position, progress in service.grid.items():
+        print(f"{position}: {json.dumps(progress)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 # report.py
+import os
 import re
 import time
 
@@ -10,17 +11,21 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from urllib.parse import quote
 
+from detail_writer import TOMBSTONE, DetailWriter
 from google_form_package import Sheet
 from process_handler import ProcessHandler
+from sheet_reader import read_columns
+from sheet_schema import get_schema
 
 web_sheet = Sheet()
-driver = web_sheet.set_driver()
+driver = web_sheet.lazy_driver()
 wait = WebDriverWait(driver, 10)
 
 def set_detail_sheet(worksheet):
     worksheet.clear()
-    headers = ["Suburb", "Total VBA per suburb"]
+    headers = get_schema("Report").columns
     worksheet.append_row(headers)
+    web_sheet.set_header(worksheet, headers)
     print("Reset the Report sheet.")
     return worksheet
 
@@ -29,7 +34,7 @@ def extract(sheet):
     delay = 5
     for attempt in range(retries):
         try:
-            sheet_header = sheet.row_values(1)
+            sheet_header = web_sheet.get_header(sheet)
             break
         except gspread.exceptions.APIError as e:
             if "429" in str(e):
@@ -43,15 +48,14 @@ def extract(sheet):
         raise Exception("Failed to fetch worksheet header after multiple attempts.")
 
     try:
-        suburb_idx = sheet_header.index("Suburb") + 1
-        postcode_idx = sheet_header.index("Postcode") + 1
+        schema = get_schema("VIC Suburbs - Tracking", sheet_header)
     except ValueError as e:
         print("Could not detect requested row", e)
         return []
 
     for attempt in range(3):
         try:
-            all_rows = sheet.get_all_values()[1:]
+            all_rows = read_columns(sheet, schema, ["Suburb", "Postcode"])
             break
         except gspread.exceptions.APIError as e:
             if "429" in str(e):
@@ -64,9 +68,7 @@ def extract(sheet):
     else:
         raise Exception("Failed to fetch all values after 3 attempts.")
     base_list = []
-    for row_num, row in enumerate(all_rows, start=2):
-        suburb = row[suburb_idx - 1] if len(row) >= suburb_idx else ""
-        postcode = row[postcode_idx - 1] if len(row) >= postcode_idx else ""
+    for suburb, postcode in all_rows:
         if not suburb:
             break
         mixed = {suburb : postcode}
@@ -78,7 +80,7 @@ def extract_detail(sheet):
     delay = 5
     for attempt in range(retries):
         try:
-            sheet_header = sheet.row_values(1)
+            sheet_header = web_sheet.get_header(sheet)
             break
         except gspread.exceptions.APIError as e:
             if "429" in str(e):
@@ -92,14 +94,14 @@ def extract_detail(sheet):
         raise Exception("Failed to fetch worksheet header after multiple attempts.")
 
     try:
-        postcode_idx = sheet_header.index("postcode") + 1
+        schema = get_schema("PractitionerDetail", sheet_header)
     except ValueError as e:
         print("Could not detect requested row", e)
         return []
 
     for attempt in range(3):
         try:
-            all_rows = sheet.get_all_values()[1:]
+            all_rows = read_columns(sheet, schema, ["postcode", "Row hash"])
             break
         except gspread.exceptions.APIError as e:
             if "429" in str(e):
@@ -112,21 +114,31 @@ def extract_detail(sheet):
     else:
         raise Exception("Failed to fetch all values after 3 attempts.")
     base_list = []
-    for row_num, row in enumerate(all_rows, start=2):
-        postcode = row[postcode_idx - 1] if len(row) >= postcode_idx else ""
-        if not postcode:
-            break
+    for postcode, content_hash in all_rows:
+        # Rows without a usable postcode are skipped; they used to end the scan and drop every later row.
+        if not postcode.isdigit():
+            continue
+        if content_hash == TOMBSTONE:
+            continue
         base_list.append(postcode)
     return base_list
 
 
+def live_links(sheet):
+    schema = get_schema("PractitionerLink", web_sheet.get_header(sheet))
+    return [link for link, in read_columns(sheet, schema, ["Link"]) if link]
+
+
 def main():
     detail_sheet = web_sheet.get_worksheet("PractitionerDetail")
     report_sheet = web_sheet.get_worksheet("Report")
     base_sheet = web_sheet.get_worksheet("VIC Suburbs - Tracking")
+    link_sheet = web_sheet.get_worksheet("PractitionerLink")
     detail_sheet.update([["Finished Scrapping"]], "S1")
     set_detail_sheet(report_sheet)
 
+    # Rows whose link vanished from this cycle's listing are marked, not deleted.
+    DetailWriter(web_sheet).tombstone(live_links(link_sheet), force=os.environ.get("FORCE_TOMBSTONES") == "1")
     base = extract(base_sheet)
     detail_postcodes = extract_detail(detail_sheet)
 
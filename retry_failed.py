@@ -0,0 +1,59 @@
+# retry_failed.py
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+import practitioner_detail_01 as detail
+from dead_letter import DeadLetterStore
+
+
+def main():
+    store = DeadLetterStore(detail.web_sheet)
+    entries = store.pending()
+    if not entries:
+        print("No failed detail pages to retry.")
+        return
+    print(f"Retrying {len(entries)} failed detail pages.")
+
+    # One browser, slower pages: give every wait more room than the shard run did.
+    detail.driver.set_page_load_timeout(300)
+    resolved = 0
+    # Entries are marked resolved only once their rows are on the sheet, so a killed job retries them again.
+    written = []
+
+    def flush():
+        detail.detail_writer.flush()
+        for done, seconds in written:
+            store.mark(done, "resolved", seconds=seconds)
+        written.clear()
+    for entry in entries:
+        start = time.time()
+        link = entry["Link"]
+        if not link.startswith("http"):
+            store.mark(entry, "unrecoverable", "Link was not captured by the link scraper")
+            continue
+        try:
+            row, reason = detail.scrape_detail(link, timeout=30)
+        except WebDriverException as e:
+            row, reason = None, f"Browser error: {e.msg}"
+        if row is None:
+            print(f"Retry failed for row {entry['RowNum']}: {reason}")
+            store.mark(entry, "pending", reason, time.time() - start)
+            continue
+
+        detail.detail_writer.write(row + [entry["postcode"]], link)
+        written.append((entry, time.time() - start))
+        if detail.detail_writer.flush_due():
+            flush()
+        resolved += 1
+        time.sleep(5)
+
+    flush()
+    detail.page_cache.save()
+    detail.geocodes.save()
+    detail.driver.quit()
+    print(f"Resolved {resolved}/{len(entries)} failed detail pages.")
+
+
+if __name__ == "__main__":
+    main()
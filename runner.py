@@ -0,0 +1,241 @@
+# runner.py
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from google_form_package import Sheet
+from link_queue import LinkQueue
+from link_reader import SheetLinkSource
+from link_staging import merge_links
+from progress_service import DETAIL_POSITIONS, LINK_POSITIONS, ProgressService
+from sheet_schema import get_schema
+
+LINK_SCRIPTS = [f"practitioner_link_{i:02d}.py" for i in range(1, 21)]
+DETAIL_SCRIPTS = [f"practitioner_detail_{i:02d}.py" for i in range(1, 21)]
+LINK_LIST_CACHE = "link_list.jsonl"
+LOG_DIR = "logs"
+
+
+def available_memory_mb():
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 4096
+
+
+def worker_count(requested=None, per_worker_mb=700):
+    cpus = os.cpu_count() or 1
+    by_memory = max(1, available_memory_mb() // per_worker_mb)
+    workers = min(cpus, by_memory)
+    if requested:
+        if requested > workers:
+            print(f"Requested {requested} workers but this host fits about {workers}.")
+        workers = requested
+    return max(1, workers)
+
+
+def share_link_list(web_sheet, path=LINK_LIST_CACHE):
+    # Read once for every detail worker, a window at a time, and written as JSON lines they can stream.
+    link_sheet = web_sheet.get_worksheet("PractitionerLink")
+    source = SheetLinkSource(link_sheet, get_schema("PractitionerLink", web_sheet.get_header(link_sheet)))
+    token, count, done = 0, 0, False
+    with open(path, "w", encoding="utf-8") as f:
+        while not done:
+            items, token, done = source.read(token)
+            f.writelines(json.dumps(item) + "\n" for item in items)
+            count += len(items)
+    print(f"Shared {count} links with the detail workers.")
+    return path
+
+
+def report_progress(web_sheet):
+    try:
+        service = ProgressService(web_sheet.get_worksheet("Progress"), retries=1)
+        view = service.summary()
+    except Exception as e:
+        print(f"Failed to read progress: {e}")
+        return
+    for label, states in view.items():
+        summary = ", ".join(f"{state}: {count}" for state, count in sorted(states.items()))
+        print(f"[progress] {label}: {summary}")
+    for label, positions in [("postcodes", LINK_POSITIONS), ("links", DETAIL_POSITIONS)]:
+        bitmap = service.completion(label, positions)
+        if bitmap:
+            print(f"[progress] {label}: {bitmap.completion():.1%} done, {bitmap.failed_count} failed")
+    pages = {}
+    for position in LINK_POSITIONS:
+        pages.update((service.grid.get(position) or {}).get("pages", {}))
+    if pages:
+        print(f"[progress] result pages: {sum(pages.values())} over {len(pages)} postcodes, "
+              f"most {max(pages.values())}")
+
+
+class Worker:
+    def __init__(self, script, env):
+        self.script = script
+        self.env = env
+        self.restarts = 0
+        self.process = None
+        self.log = None
+
+    def start(self):
+        os.makedirs(LOG_DIR, exist_ok=True)
+        self.log = open(os.path.join(LOG_DIR, self.script.replace(".py", ".log")), "a", encoding="utf-8")
+        self.process = subprocess.Popen([sys.executable, "-u", self.script], env=self.env,
+                                        stdout=self.log, stderr=subprocess.STDOUT)
+        print(f"Started {self.script} (pid {self.process.pid})")
+
+    def poll(self):
+        code = self.process.poll()
+        if code is not None and self.log:
+            self.log.close()
+            self.log = None
+        return code
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            # ProcessHandler saves progress on SIGTERM before exiting.
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=120)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def run_stage(scripts, workers, env, max_restarts=3, stagger=5, report_every=300, web_sheet=None):
+    queue = [Worker(script, env) for script in scripts]
+    running = []
+    failed = []
+    last_report = time.time()
+    try:
+        while queue or running:
+            while queue and len(running) < workers:
+                worker = queue.pop(0)
+                worker.start()
+                running.append(worker)
+                time.sleep(stagger)
+
+            for worker in list(running):
+                code = worker.poll()
+                if code is None:
+                    continue
+                running.remove(worker)
+                if code == 0:
+                    print(f"{worker.script} finished.")
+                elif worker.restarts < max_restarts:
+                    worker.restarts += 1
+                    print(f"{worker.script} exited with {code}. Restarting ({worker.restarts}/{max_restarts})")
+                    queue.append(worker)
+                else:
+                    print(f"{worker.script} exited with {code} after {max_restarts} restarts. Giving up.")
+                    failed.append(worker.script)
+
+            if web_sheet and time.time() - last_report > report_every:
+                report_progress(web_sheet)
+                last_report = time.time()
+            time.sleep(2)
+    finally:
+        for worker in running:
+            worker.stop()
+    return failed
+
+
+def open_link_queue(web_sheet):
+    # A fresh queue per cycle, unless detail shards already hold RowNum cursors into the current one.
+    queue = LinkQueue()
+    try:
+        grid = ProgressService(web_sheet.get_worksheet("Progress"), retries=3).load()
+        started = any((grid.get(position) or {}).get("progress", "setting") != "setting"
+                      for position in DETAIL_POSITIONS)
+    except Exception as e:
+        print(f"Failed to read progress: {e}")
+        started = True
+    if started and os.path.exists(queue.path):
+        print(f"Resuming the link queue at {queue.path}.")
+        queue.reopen()
+    else:
+        queue.reset()
+    return queue
+
+
+def run_streaming(workers, env, max_restarts, web_sheet):
+    # Link and detail shards run side by side: link shards publish each postcode's links to a local queue
+    # and detail shards pick them up straight away instead of waiting for PractitionerLink.
+    queue = open_link_queue(web_sheet)
+    env["LINK_QUEUE"] = os.path.abspath(queue.path)
+    link_workers = max(1, workers // 2)
+    detail_workers = max(1, workers - link_workers)
+    print(f"Streaming with {link_workers} link and {detail_workers} detail workers.")
+    failed = []
+    detail_stage = threading.Thread(
+        target=lambda: failed.extend(run_stage(DETAIL_SCRIPTS, detail_workers, env, max_restarts)))
+    detail_stage.start()
+    try:
+        link_failed = run_stage(LINK_SCRIPTS, link_workers, env, max_restarts, web_sheet=web_sheet)
+    except BaseException:
+        queue.abort()
+        raise
+    if link_failed:
+        # Some postcodes were never published: detail shards hand their rows off instead of finishing.
+        queue.abort()
+    else:
+        # Detail shards finish once they drain the closed queue.
+        queue.close()
+    failed += link_failed
+    merge_links(web_sheet, env["LINK_STAGING"])
+    detail_stage.join()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run practitioner shard workers on one host.")
+    parser.add_argument("stage", choices=["link", "detail", "all"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-restarts", type=int, default=3)
+    parser.add_argument("--stream", action="store_true",
+                        help="with 'all', start detail shards alongside the link shards")
+    parser.add_argument("--cycle-minutes", type=float, default=float(os.environ.get("CYCLE_MINUTES", 0)) or None,
+                        help="wall time for the whole run; every worker stops by this deadline")
+    args = parser.parse_args()
+
+    workers = worker_count(args.workers)
+    print(f"Running with {workers} workers.")
+    web_sheet = Sheet()
+    env = dict(os.environ)
+    # All link shards share this host, so they stage their rows on local disk.
+    env.setdefault("LINK_STAGING", "file")
+    if args.cycle_minutes:
+        # One deadline for the run: a worker started hours in gets what is left, not a fresh budget.
+        env["CYCLE_DEADLINE"] = str(int(time.time() + args.cycle_minutes * 60))
+        print(f"Workers stop by {time.strftime('%H:%M:%S', time.localtime(float(env['CYCLE_DEADLINE'])))}.")
+    failed = []
+
+    if args.stream and args.stage == "all":
+        failed += run_streaming(workers, env, args.max_restarts, web_sheet)
+    else:
+        if args.stage in ("link", "all"):
+            failed += run_stage(LINK_SCRIPTS, workers, env, args.max_restarts, web_sheet=web_sheet)
+            merge_links(web_sheet, env["LINK_STAGING"])
+        if args.stage in ("detail", "all"):
+            env["LINK_LIST_CACHE"] = os.path.abspath(share_link_list(web_sheet))
+            failed += run_stage(DETAIL_SCRIPTS, workers, env, args.max_restarts, web_sheet=web_sheet)
+
+    report_progress(web_sheet)
+    if failed:
+        print(f"Failed workers: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
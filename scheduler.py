@@ -0,0 +1,156 @@
+# scheduler.py
+import os
+import time
+
+from process_handler import ProcessHandler, write_confirmed
+from progress_service import DETAIL_POSITIONS, ProgressService
+
+
+class BudgetScheduler:
+    def __init__(self, budget=14400, margin=600, default_item_time=60, start=None, deadline=None):
+        self.budget = budget
+        # CYCLE_DEADLINE (epoch seconds) is set by runner.py, so workers started late in a run stop with it.
+        if deadline is None and os.environ.get("CYCLE_DEADLINE"):
+            deadline = float(os.environ["CYCLE_DEADLINE"])
+        self.deadline = deadline
+        self.margin = margin
+        self.default_item_time = default_item_time
+        self.start = start if start is not None else time.time()
+        self.items = 0
+        self.total_time = 0.0
+        self.slowest = 0.0
+        self.item_start = None
+
+    def begin_item(self):
+        self.item_start = time.time()
+
+    def end_item(self):
+        if self.item_start is None:
+            return
+        spent = time.time() - self.item_start
+        self.items += 1
+        self.total_time += spent
+        self.slowest = max(self.slowest, spent)
+        self.item_start = None
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def remaining(self):
+        remaining = self.budget - self.elapsed()
+        if self.deadline is not None:
+            remaining = min(remaining, self.deadline - time.time())
+        return remaining
+
+    def item_time(self):
+        if not self.items:
+            return self.default_item_time
+        return self.total_time / self.items
+
+    def has_budget(self):
+        # Keep enough room for one worst-case item plus the final checkpoint.
+        next_item = max(self.item_time(), self.slowest)
+        return self.remaining() - self.margin > next_item
+
+    def estimate(self, items_left):
+        return items_left * self.item_time()
+
+    def stats(self):
+        return {"items": self.items, "rate": round(self.item_time(), 2)}
+
+
+def remaining_rows(progress, total, stride=20):
+    row_num = progress.get("RowNum", 0)
+    if row_num >= total:
+        return 0
+    return (total - row_num + stride - 1) // stride
+
+
+def claim_handoff(progress_sheet, own_position, shutdown_callback=None, positions=DETAIL_POSITIONS, stale_after=900):
+    # Returns a ProcessHandler that owns the claimed cell, or None.
+    try:
+        grid = ProgressService(progress_sheet, retries=3).load()
+    except Exception as e:
+        print(f"{e} Nothing to rebalance.")
+        return None
+
+    candidates = []
+    for position in positions:
+        progress = grid.get(position)
+        if position == own_position or not progress:
+            continue
+        owner = progress.get("owner")
+        stale = time.time() - progress.get("ts", 0) > stale_after
+        if progress.get("progress") == "handoff" and (not owner or stale):
+            candidates.append((progress.get("rate", 0), position, progress))
+        elif progress.get("progress") == "processing" and owner and owner != position and stale:
+            candidates.append((progress.get("rate", 0), position, progress))
+
+    # Slowest shards first: they hold the most remaining wall time.
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    for _, position, _ in candidates:
+        handler = ProcessHandler(progress_sheet, {"progress": "handoff", "RowNum": 0}, position,
+                                 shutdown_callback=shutdown_callback, owner=own_position)
+        # claim() writes a token and reads it back after a pause, so of two helpers racing only one goes on.
+        if handler.claim(stale_after):
+            print(f"Claimed unfinished rows of {position} from row {handler.progress.get('RowNum')}")
+            return handler
+    return None
+
+
+def steal_tail(ph, flush_every, positions=DETAIL_POSITIONS, stride=20, stale_after=900):
+    # A shard with nothing left splits the busiest running range and takes its back half into its own cell.
+    # The running shard picks up the new end on its next save, so the split sits past the rows it can reach
+    # before then.
+    if ph.progress.get("progress") != "finished":
+        return False
+    try:
+        grid = ProgressService(ph.progress_sheet, retries=3).load()
+    except Exception as e:
+        print(f"{e} Nothing to split.")
+        return False
+    # Only a shard that reached the end of the list knows how long it is.
+    total = max([(grid.get(position) or {}).get("total", 0) for position in positions])
+    gap = stride * (flush_every + 2)
+    best = None
+    for position in positions:
+        progress = grid.get(position) or {}
+        if position == ph.position or progress.get("progress") != "processing" or not progress.get("owner"):
+            continue
+        if time.time() - progress.get("ts", 0) > stale_after:
+            continue
+        end = progress.get("end") or total
+        left = end - progress.get("RowNum", 0)
+        if left >= 2 * gap and (best is None or left > best[0]):
+            best = (left, position, progress)
+    if best is None:
+        return False
+
+    left, position, progress = best
+    split = progress["RowNum"] + max(gap, left // (2 * stride) * stride)
+    taken = {}
+
+    def shorten(current):
+        if (not current or current.get("progress") != "processing" or current.get("owner") != progress["owner"]
+                or current.get("RowNum", 0) > split - gap):
+            return None
+        if current.get("end") is not None and current["end"] <= split:
+            return None
+        taken["end"] = current.get("end")
+        current["end"] = split
+        return current
+
+    try:
+        # Confirmed like a claim, so two idle shards cannot both take the same back half.
+        if write_confirmed(ph.progress_sheet, position, shorten) is None:
+            return False
+    except Exception as e:
+        print(f"Failed to split {position}: {e}")
+        return False
+    stolen = {"progress": "processing", "RowNum": split, "end": taken["end"], "links": ph.progress.get("links"),
+              "from": position}
+    if not ph.save_progress(stolen):
+        return False
+    ph.progress = stolen
+    print(f"Took rows {split} to {taken['end'] or 'the end'} of {position}.")
+    return True
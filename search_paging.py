@@ -0,0 +1,65 @@
+# search_paging.py
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select, WebDriverWait
+
+# Result-size controls Salesforce community search pages tend to render, plain select first.
+PAGE_SIZE_SELECTS = [
+    "//select[contains(translate(@name, 'PAGESIZE', 'pagesize'), 'pagesize')"
+    " or contains(translate(@name, 'LIMT', 'limt'), 'limit') or contains(@class, 'page-size')]",
+]
+PAGE_SIZE_COMBOBOXES = [
+    "//lightning-combobox[contains(translate(@label, 'PERAGSIZ', 'peragsiz'), 'per page')"
+    " or contains(translate(@label, 'PERAGSIZ', 'peragsiz'), 'page size')]",
+]
+# Any result row or pager button means the search has rendered.
+RESULTS_XPATH = ("//lightning-layout-item[contains(@class, 'search-result-style')]"
+                 " | //button[contains(@kx-type, 'underline')]")
+page_size_found = {"size": None, "misses": 0}
+
+
+def numeric_options(values):
+    return sorted((int(value), value) for value in values if value and value.strip().isdigit())
+
+
+def select_largest_page_size(driver, timeout=5, results_timeout=15):
+    # After a few searches without a size control, stop looking for one on every postcode.
+    if page_size_found["misses"] >= 3:
+        return None
+    try:
+        WebDriverWait(driver, results_timeout).until(EC.presence_of_element_located((By.XPATH, RESULTS_XPATH)))
+    except TimeoutException:
+        # No results, or not rendered yet: that says nothing about the size control.
+        return None
+    try:
+        for xpath in PAGE_SIZE_SELECTS:
+            for element in driver.find_elements(By.XPATH, xpath):
+                select = Select(element)
+                options = numeric_options(option.get_attribute("value") for option in select.options)
+                if options:
+                    select.select_by_value(options[-1][1])
+                    return found(options[-1][0])
+        for xpath in PAGE_SIZE_COMBOBOXES:
+            for element in driver.find_elements(By.XPATH, xpath):
+                element.find_element(By.XPATH, ".//button").click()
+                items = WebDriverWait(element, timeout).until(
+                    EC.presence_of_all_elements_located((By.XPATH, ".//*[@role='option']")))
+                options = numeric_options(item.get_attribute("data-value") for item in items)
+                if options:
+                    items[[item.get_attribute("data-value") for item in items].index(options[-1][1])].click()
+                    return found(options[-1][0])
+    except (NoSuchElementException, TimeoutException, WebDriverException) as e:
+        print(f"Could not change the result page size: {e}")
+        return page_size_found["size"]
+    page_size_found["misses"] += 1
+    if page_size_found["misses"] == 3:
+        print("No result page size control; paging with the default size.")
+    return None
+
+
+def found(size):
+    if page_size_found["size"] != size:
+        print(f"Showing {size} results per page.")
+    page_size_found["size"] = size
+    return size
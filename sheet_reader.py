@@ -0,0 +1,17 @@
+# sheet_reader.py
+def read_columns(worksheet, schema, columns, start_row=2, end_row=None):
+    ranges = [schema.column_range(column, start_row, end_row) for column in columns]
+    value_ranges = worksheet.batch_get(ranges, major_dimension="COLUMNS")
+    column_values = [value_range[0] if value_range else [] for value_range in value_ranges]
+    row_count = max((len(values) for values in column_values), default=0)
+    rows = []
+    for i in range(row_count):
+        rows.append([values[i] if i < len(values) else "" for values in column_values])
+    return rows
+
+
+def read_new_rows(worksheet, schema, columns, high_water, limit=None):
+    # high_water is the last sheet row already consumed (1 = header only).
+    end_row = high_water + limit if limit else None
+    rows = read_columns(worksheet, schema, columns, start_row=high_water + 1, end_row=end_row)
+    return rows, high_water + len(rows)
@@ -0,0 +1,73 @@
+# sheet_schema.py
+from gspread.utils import rowcol_to_a1
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class SheetSchema:
+    def __init__(self, name, columns, version, fixed=True):
+        self.name = name
+        self.columns = list(columns)
+        self.version = version
+        self.fixed = fixed
+        # None marks a slot that is not ours to check, e.g. the status cell in the header row.
+        self.index = {column: i + 1 for i, column in enumerate(self.columns) if column} if fixed else {}
+        self.validated = False
+
+    def validate(self, header):
+        if self.fixed:
+            for column, idx in self.index.items():
+                live = header[idx - 1] if len(header) >= idx else ""
+                if live != column:
+                    raise SchemaError(f"{self.name} v{self.version}: expected '{column}' in column {idx}, found '{live}'")
+        else:
+            index = {}
+            for column in self.columns:
+                if column not in header:
+                    raise SchemaError(f"{self.name} v{self.version}: column '{column}' not found in header")
+                index[column] = header.index(column) + 1
+            self.index = index
+        self.validated = True
+        return self
+
+    def header(self):
+        return [column or "" for column in self.columns]
+
+    def col(self, column):
+        if column not in self.index:
+            raise SchemaError(f"{self.name} v{self.version}: unknown column '{column}'")
+        return self.index[column]
+
+    def letter(self, column):
+        return rowcol_to_a1(1, self.col(column))[:-1]
+
+    def column_range(self, column, start_row=2, end_row=None):
+        letter = self.letter(column)
+        return f"{letter}{start_row}:{letter}{end_row if end_row else ''}"
+
+
+SCHEMAS = {
+    "PractitionerLink": SheetSchema("PractitionerLink", ["postcode", "Name", "Link"], version=1),
+    "PractitionerDetail": SheetSchema("PractitionerDetail", [
+        "Name", "Category", "Business address", "Contact Details",
+        "Limitations", "Conditions", "Status", "Registration number", "Commenced", "Anniversary",
+        "Expires", "Date registration was suspended, cancelled or surrendered (if applicable)",
+        "Reason for Suspension or Cancellation (if applicable)", "Director Name", "Partnership details", " lat",
+        "long", "postcode", None, "Row hash", "Link"], version=2),
+    "Report": SheetSchema("Report", ["Suburb", "Total VBA per suburb"], version=1),
+    "DeadLetter": SheetSchema("DeadLetter", ["RowNum", "Link", "postcode", "Reason", "Seconds", "Shard",
+                                             "Failed at", "Attempts", "Status"], version=1),
+    # Maintained by hand, so only the columns we read are pinned and located by name.
+    "VIC Suburbs - Tracking": SheetSchema("VIC Suburbs - Tracking", ["Suburb", "Postcode"], version=1, fixed=False),
+}
+
+
+def get_schema(sheet_name, header=None):
+    if sheet_name not in SCHEMAS:
+        raise SchemaError(f"No schema registered for '{sheet_name}'")
+    schema = SCHEMAS[sheet_name]
+    if header is not None and not schema.validated:
+        schema.validate(header)
+    return schema
@@ -0,0 +1,142 @@
+# spatial_index.py
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from detail_writer import TOMBSTONE
+from google_form_package import Sheet
+from sheet_reader import read_columns
+from sheet_schema import get_schema
+
+INDEX_DIR = "index"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+CELL_DEGREES = 0.05
+COLUMNS_PER_ROW = 10000
+ARRAYS = ["cells", "lats", "longs", "rows"]
+
+
+def to_cells(lats, longs, cell_degrees=CELL_DEGREES):
+    # Grid buckets numbered row-major, so one grid row of cells is one contiguous id range.
+    grid_rows = np.floor((np.asarray(lats) + 90) / cell_degrees).astype(np.int64)
+    grid_cols = np.floor((np.asarray(longs) + 180) / cell_degrees).astype(np.int64)
+    return grid_rows * COLUMNS_PER_ROW + grid_cols
+
+
+def haversine_km(lat, long, lats, longs):
+    lat, long = math.radians(lat), math.radians(long)
+    lats, longs = np.radians(lats), np.radians(longs)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((longs - long) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    def __init__(self, cells, lats, longs, rows, cell_degrees=CELL_DEGREES):
+        self.cells = cells
+        self.lats = lats
+        self.longs = longs
+        self.rows = rows
+        self.cell_degrees = cell_degrees
+
+    @classmethod
+    def build(cls, points, cell_degrees=CELL_DEGREES):
+        # points: (sheet row, lat, long) for every geocoded practitioner.
+        points = np.array(points, dtype=np.float64).reshape(-1, 3)
+        cells = to_cells(points[:, 1], points[:, 2], cell_degrees)
+        order = np.argsort(cells, kind="stable")
+        return cls(cells[order], points[order, 1], points[order, 2], points[order, 0].astype(np.int32), cell_degrees)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def save(self, path=INDEX_DIR):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            tmp_path = os.path.join(path, f"spatial_{name}.tmp.npy")
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(path, f"spatial_{name}.npy"))
+        with open(os.path.join(path, "spatial.json"), "w", encoding="utf-8") as f:
+            json.dump({"cell_degrees": self.cell_degrees, "count": len(self)}, f)
+        print(f"Saved a spatial index of {len(self)} practitioners to {path}.")
+
+    @classmethod
+    def load(cls, path=INDEX_DIR, mmap=True):
+        with open(os.path.join(path, "spatial.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(path, f"spatial_{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in ARRAYS]
+        return cls(*arrays, cell_degrees=meta["cell_degrees"])
+
+    def candidates(self, lat, long, km):
+        row_span = math.ceil(km / (KM_PER_DEGREE * self.cell_degrees))
+        # Longitude degrees shrink towards the poles; size the column span for the widest-latitude row.
+        far_lat = min(abs(lat) + (row_span + 1) * self.cell_degrees, 89.9)
+        col_km = KM_PER_DEGREE * self.cell_degrees * math.cos(math.radians(far_lat))
+        col_span = min(math.ceil(km / col_km), int(360 / self.cell_degrees))
+        center = int(to_cells(lat, long, self.cell_degrees))
+        center_row, center_col = divmod(center, COLUMNS_PER_ROW)
+        ranges = []
+        last_row = int(180 / self.cell_degrees)
+        for grid_row in range(max(center_row - row_span, 0), min(center_row + row_span, last_row) + 1):
+            low = grid_row * COLUMNS_PER_ROW + max(center_col - col_span, 0)
+            high = grid_row * COLUMNS_PER_ROW + min(center_col + col_span, COLUMNS_PER_ROW - 1)
+            start = np.searchsorted(self.cells, low, side="left")
+            end = np.searchsorted(self.cells, high, side="right")
+            if start < end:
+                ranges.append(np.arange(start, end))
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+    def radius(self, lat, long, km):
+        idx = self.candidates(lat, long, km)
+        distances = haversine_km(lat, long, self.lats[idx], self.longs[idx])
+        keep = distances <= km
+        idx, distances = idx[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return [(int(self.rows[i]), float(d)) for i, d in zip(idx[order], distances[order])]
+
+    def nearest(self, lat, long, k=10, start_km=5):
+        # A radius search that finds k points holds the true k nearest; widen until it does.
+        if not len(self):
+            return []
+        km = start_km
+        while km < 2 * EARTH_RADIUS_KM:
+            found = self.radius(lat, long, km)
+            if len(found) >= k:
+                return found[:k]
+            km *= 2
+        distances = haversine_km(lat, long, self.lats, self.longs)
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(int(self.rows[i]), float(distances[i])) for i in order]
+
+
+def read_points(web_sheet):
+    detail_sheet = web_sheet.get_worksheet("PractitionerDetail")
+    schema = get_schema("PractitionerDetail", web_sheet.get_header(detail_sheet))
+    points = []
+    rows = read_columns(detail_sheet, schema, [" lat", "long", "Row hash"])
+    for row_num, (lat, long, content_hash) in enumerate(rows, start=2):
+        if content_hash == TOMBSTONE:
+            continue
+        try:
+            points.append((row_num, float(lat), float(long)))
+        except ValueError:
+            continue
+    print(f"Read {len(points)} geocoded practitioners out of {len(rows)} rows.")
+    return points
+
+
+def main():
+    if len(sys.argv) == 4:
+        index = SpatialIndex.load()
+        lat, long, km = map(float, sys.argv[1:])
+        for row_num, distance in index.radius(lat, long, km):
+            print(f"row {row_num}: {distance:.2f} km")
+        return
+    SpatialIndex.build(read_points(Sheet())).save()
+
+
+if __name__ == "__main__":
+    main()